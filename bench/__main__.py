@@ -0,0 +1,98 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from bench import cases
+
+
+def measure(f: callable, items: list, min_time: float):
+    # Warm up caches and lazily compiled state first
+    for item in items:
+        f(item)
+
+    count = 0
+    start = time.perf_counter()
+
+    while True:
+        for item in items:
+            f(item)
+
+        count += len(items)
+        elapsed = time.perf_counter() - start
+
+        if elapsed >= min_time:
+            break
+
+    gc.collect()
+    tracemalloc.start()
+
+    before, _ = tracemalloc.get_traced_memory()
+
+    for item in items:
+        f(item)
+
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'ops': count / elapsed,
+        'peak_kib': (peak - before) / 1024,
+        'retained_bytes_per_op': (current - before) / len(items),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python3 -m bench', description='Offline hot path benchmarks')
+    parser.add_argument('cases', nargs='*', help=f'cases to run (default: all of {", ".join(cases.CASES)})')
+    parser.add_argument('--min-time', type=float, default=1.0, help='seconds to run each case for')
+    parser.add_argument('--baseline', default='bench_baseline.json', help='baseline file')
+    parser.add_argument('--save', action='store_true', help='save results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed ops/sec drop compared to the baseline before failing')
+    args = parser.parse_args()
+
+    baseline = {}
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    rng, buffers, lines = cases.setup()
+    results = {}
+    regressions = []
+
+    print(f'{"case":<24}{"ops/sec":>14}{"peak KiB":>12}{"retained B/op":>16}{"vs baseline":>14}')
+
+    for name in args.cases or cases.CASES:
+        f, items = cases.CASES[name](rng, buffers, lines)
+        result = results[name] = measure(f, items, args.min_time)
+
+        change = ''
+
+        if name in baseline:
+            ratio = result['ops'] / baseline[name]['ops']
+            change = f'{(ratio - 1) * 100:+.1f}%'
+
+            if ratio < 1 - args.tolerance:
+                regressions.append(name)
+
+        print(f'{name:<24}{result["ops"]:>14,.0f}{result["peak_kib"]:>12.1f}'
+              f'{result["retained_bytes_per_op"]:>16.1f}{change:>14}')
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({**baseline, **results}, f, indent=2, sort_keys=True)
+
+        print(f'Saved baseline to {args.baseline}')
+
+    if regressions:
+        print(f'Regressed by more than {args.tolerance * 100:.0f}%: {", ".join(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import random
+
+from bench import corpus
+from config import Config
+from routing import RoutingTable
+from tag_filter import TagFilter
+from utils import Utils
+
+CHANNELS = 500
+DMS = 200
+LINES = 5000
+
+
+class StubRelayClient:
+    def __init__(self, buffers: list):
+        self._buffers = {buffer.pointer: buffer for buffer in buffers}
+
+    def wait_for_buffer_by_pointer(self, pointer: str, timeout: int = 5):
+        return self._buffers.get(pointer)
+
+
+class StubDmChannels:
+    def wait_for(self, channel: str, timeout: float = 5):
+        return True
+
+
+class StubSlackClient:
+    def __init__(self):
+        self.dm_channels = StubDmChannels()
+        self.sent = 0
+
+    def send_message(self, channel: str, username: str, msg: str, priority=None, trace=None):
+        self.sent += 1
+
+    def send_me_message(self, channel: str, msg: str, priority=None, trace=None):
+        self.sent += 1
+
+
+class StubCoalescer:
+    def add(self, channel: str, tags_array: list, msg: str):
+        pass
+
+
+def setup():
+    rng = random.Random(1337)
+
+    # Benchmarks run against a synthetic configuration, never the user's one
+    Config.Global.Channels = corpus.channels(CHANNELS)
+    Config.Global.PrivMsgs = corpus.privmsgs()
+    Config.Relay.Filters = corpus.filters(list(Config.Global.Channels.keys()), rng)
+
+    buffers = corpus.buffers(list(Config.Global.Channels.keys()), rng, DMS)
+    lines = corpus.lines(buffers, LINES, rng)
+
+    return rng, buffers, lines
+
+
+def remove_color(rng: random.Random, buffers: list, lines: list):
+    strings = [line['message'] for line in lines] + [line['prefix'] for line in lines]
+
+    return Utils.weechat_string_remove_color, strings
+
+
+def dm_channel_for_buffer(rng: random.Random, buffers: list, lines: list):
+    routing = RoutingTable(Config.Global.Channels, Config.Global.PrivMsgs)
+
+    return routing.dm_channel_for_buffer, [buffer.full_name for buffer in buffers]
+
+
+def reverse_route(rng: random.Random, buffers: list, lines: list):
+    routing = RoutingTable(Config.Global.Channels, Config.Global.PrivMsgs)
+
+    return routing.buffer_for_slack_channel, list(Config.Global.Channels.values())
+
+
+def filters(rng: random.Random, buffers: list, lines: list):
+    app = create_app(buffers)
+    by_pointer = {buffer.pointer: buffer.full_name for buffer in buffers}
+    items = [(by_pointer[line['buffer']], line['tags_array']) for line in lines]
+
+    return lambda item: app.filters.match(*item), items
+
+
+def route_line(rng: random.Random, buffers: list, lines: list):
+    return create_app(buffers)._on_buffer_line_added, lines
+
+
+def create_app(buffers: list):
+    from main import WeeChatRelay2Slack
+    from workspace import Workspace
+
+    # Skip __init__, it would connect to WeeChat and Slack
+    app = WeeChatRelay2Slack.__new__(WeeChatRelay2Slack)
+    app.filters = TagFilter(Config.Relay.Filters)
+    app.relays = {'': StubRelayClient(buffers)}
+    app.coalescer = StubCoalescer()
+
+    workspace = Workspace('', '', '', RoutingTable(Config.Global.Channels, Config.Global.PrivMsgs))
+    workspace.slack_client = StubSlackClient()
+
+    app.workspaces = {'': workspace}
+
+    return app
+
+
+CASES = {
+    'remove_color': remove_color,
+    'dm_channel_for_buffer': dm_channel_for_buffer,
+    'reverse_route': reverse_route,
+    'filters': filters,
+    'route_line': route_line,
+}
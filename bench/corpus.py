@@ -0,0 +1,86 @@
+import random
+
+NETWORKS = ['freenode', 'oftc', 'libera']
+WORDS = ['the', 'build', 'is', 'broken', 'again', 'did', 'anyone', 'flash', 'latest', 'nightly', 'on', 'my',
+         'device', 'kernel', 'panic', 'after', 'boot', 'thanks', 'lol', 'ok', 'merged', 'review', 'please']
+
+
+class Buffer:
+    def __init__(self, pointer: str, full_name: str):
+        self.pointer = pointer
+        self.full_name = full_name
+
+
+def nick(rng: random.Random):
+    return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz_') for _ in range(rng.randint(3, 12)))
+
+
+def text(rng: random.Random):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 20)))
+
+
+def channels(count: int):
+    return {f'irc.{NETWORKS[i % len(NETWORKS)]}.#channel-{i}': f'channel-{i}' for i in range(count)}
+
+
+def privmsgs():
+    return {f'irc.{network}.': f'_{network}_dm_' for network in NETWORKS}
+
+
+def filters(channel_names: list, rng: random.Random):
+    return {name: [f'nick_{nick(rng)}+irc_join', f'nick_{nick(rng)}+irc_quit', 'irc_mode']
+            for name in channel_names}
+
+
+def buffers(channel_names: list, rng: random.Random, dm_count: int):
+    names = list(channel_names)
+    names += [f'irc.{rng.choice(NETWORKS)}.{nick(rng)}' for _ in range(dm_count)]
+    names += [f'irc.server.{network}' for network in NETWORKS]
+
+    return [Buffer(f'{0x55d0c0000000 + i * 0x1000:x}', name) for i, name in enumerate(names)]
+
+
+def colored_prefix(rng: random.Random):
+    return rng.choice([f'\x19{rng.randint(10, 16)}{nick(rng)}',
+                       f'\x19F@00{rng.randint(100, 255)}{nick(rng)}',
+                       f'\x19F*{rng.randint(10, 16)}@{nick(rng)}'])
+
+
+def colored_join(n: str, channel: str):
+    return f'\x19F12{n}\x1928 (\x1927~{n}@host.example.org\x1928)\x19F05 has joined \x1913{channel}\x19F05'
+
+
+def colored_quit(n: str):
+    return f'\x19F12{n}\x1928 (\x1927~{n}@host.example.org\x1928)\x19F03 has quit \x1928(\x19F00*.net *.split\x1928)'
+
+
+def lines(buffer_list: list, count: int, rng: random.Random):
+    ret = []
+
+    for _ in range(count):
+        buffer = rng.choice(buffer_list)
+        n = nick(rng)
+        kind = rng.random()
+
+        if kind < 0.6:
+            tags = ['irc_privmsg', f'nick_{n}', 'notify_message', 'log1']
+            message = text(rng) if rng.random() < 0.8 else f'\x02{text(rng)}\x0f \x19F05{text(rng)}'
+        elif kind < 0.75:
+            tags = ['irc_join', f'nick_{n}', 'irc_smart_filter', 'log4']
+            message = colored_join(n, buffer.full_name.split('.')[-1])
+        elif kind < 0.9:
+            tags = ['irc_quit', f'nick_{n}', 'irc_smart_filter', 'log4']
+            message = colored_quit(n)
+        else:
+            tags = ['irc_numeric', 'irc_333', 'log3']
+            message = text(rng)
+
+        ret.append({
+            'buffer': buffer.pointer,
+            'prefix': colored_prefix(rng),
+            'message': message,
+            'tags_array': tags,
+            'highlight': b'\x00',
+        })
+
+    return ret
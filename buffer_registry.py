@@ -0,0 +1,78 @@
+import threading
+
+
+class BufferRegistry:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._by_pointer = {}
+        self._by_full_name = {}
+
+    @staticmethod
+    def normalize_pointer(pointer: str):
+        # Relay sends pointers as bare hex, while requests use the 0x prefix
+        pointer = pointer.lower()
+
+        return pointer[2:] if pointer.startswith('0x') else pointer
+
+    def add(self, buffer):
+        pointer = BufferRegistry.normalize_pointer(buffer.pointer)
+
+        with self._cond:
+            old = self._by_pointer.get(pointer)
+
+            if old is not None and self._by_full_name.get(old.full_name) is old:
+                del self._by_full_name[old.full_name]
+
+            self._by_pointer[pointer] = buffer
+            self._by_full_name[buffer.full_name] = buffer
+
+            self._cond.notify_all()
+
+    def remove(self, pointer: str = None, full_name: str = None):
+        with self._cond:
+            if pointer is not None:
+                buffer = self._by_pointer.get(BufferRegistry.normalize_pointer(pointer))
+            else:
+                buffer = self._by_full_name.get(full_name)
+
+            if buffer is None:
+                return None
+
+            self._by_pointer.pop(BufferRegistry.normalize_pointer(buffer.pointer), None)
+
+            if self._by_full_name.get(buffer.full_name) is buffer:
+                del self._by_full_name[buffer.full_name]
+
+            return buffer
+
+    def replace(self, buffers: list):
+        with self._cond:
+            self._by_pointer = {BufferRegistry.normalize_pointer(buffer.pointer): buffer for buffer in buffers}
+            self._by_full_name = {buffer.full_name: buffer for buffer in buffers}
+
+            self._cond.notify_all()
+
+    def clear(self):
+        with self._cond:
+            self._by_pointer.clear()
+            self._by_full_name.clear()
+
+    def buffers(self):
+        with self._cond:
+            return list(self._by_pointer.values())
+
+    def get_by_pointer(self, pointer: str):
+        with self._cond:
+            return self._by_pointer.get(BufferRegistry.normalize_pointer(pointer))
+
+    def get_by_full_name(self, full_name: str):
+        with self._cond:
+            return self._by_full_name.get(full_name)
+
+    def wait_for_pointer(self, pointer: str, timeout: float):
+        pointer = BufferRegistry.normalize_pointer(pointer)
+
+        with self._cond:
+            self._cond.wait_for(lambda: pointer in self._by_pointer, timeout)
+
+            return self._by_pointer.get(pointer)
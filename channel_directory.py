@@ -0,0 +1,118 @@
+import threading
+import time
+
+
+class ChannelDirectory:
+    fetch: callable
+    refetch_interval: float
+
+    def __init__(self, fetch: callable, refetch_interval: float = 5):
+        self.fetch = fetch
+        self.refetch_interval = refetch_interval
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._by_id = {}
+        self._by_name = {}
+        self._last_fetch = None
+
+        # Number of fetches in flight, misses meanwhile wait for them instead of fetching again
+        self._fetching = 0
+
+    def refresh(self):
+        with self._lock:
+            self._fetching += 1
+
+        self._fetch()
+
+    def _fetch(self):
+        # Called once _fetching has been raised for it
+        try:
+            channels = self.fetch()
+
+            with self._lock:
+                self._replace(channels)
+                self._last_fetch = time.monotonic()
+        finally:
+            with self._cond:
+                self._fetching -= 1
+                self._cond.notify_all()
+
+    def seed(self, channels: list):
+        # Channels known from a previous run, a miss still refetches right away
+        with self._lock:
+            self._replace(channels)
+
+    def _replace(self, channels: list):
+        self._by_id = {}
+        self._by_name = {}
+
+        for channel in channels:
+            self._put(channel)
+
+    def _refresh_on_miss(self):
+        # Unknown ids (IMs, private groups, typos) should not hammer channels.list
+        with self._cond:
+            if self._fetching:
+                self._cond.wait_for(lambda: not self._fetching)
+                return True
+
+            if self._last_fetch is not None and time.monotonic() - self._last_fetch < self.refetch_interval:
+                return False
+
+            self._fetching += 1
+
+        self._fetch()
+
+        return True
+
+    def _put(self, channel: dict):
+        old = self._by_id.get(channel.get('id'))
+
+        if old is not None:
+            self._by_name.pop(old.get('name', '').lower(), None)
+
+        self._by_id[channel.get('id')] = channel
+        self._by_name[channel.get('name', '').lower()] = channel
+
+    def get_by_id(self, channel_id: str, refetch: bool = True):
+        with self._lock:
+            channel = self._by_id.get(channel_id)
+
+        if channel is None and refetch and self._refresh_on_miss():
+            with self._lock:
+                channel = self._by_id.get(channel_id)
+
+        return channel
+
+    def get_by_name(self, name: str, refetch: bool = True):
+        with self._lock:
+            channel = self._by_name.get(name.lower())
+
+        if channel is None and refetch and self._refresh_on_miss():
+            with self._lock:
+                channel = self._by_name.get(name.lower())
+
+        return channel
+
+    def channels(self):
+        with self._lock:
+            return list(self._by_id.values())
+
+    def put(self, channel: dict):
+        with self._lock:
+            self._put(channel)
+
+    def update(self, channel_id: str, **kwargs):
+        with self._lock:
+            channel = self._by_id.get(channel_id)
+
+            if channel is not None:
+                self._put({**channel, **kwargs})
+
+    def remove(self, channel_id: str):
+        with self._lock:
+            channel = self._by_id.pop(channel_id, None)
+
+            if channel is not None:
+                self._by_name.pop(channel.get('name', '').lower(), None)
@@ -0,0 +1,190 @@
+class Config:
+    class Relay:
+        Hostname = ''
+        Password = ''
+        Port = 0
+        UseSSL = False
+
+        # More WeeChat instances to bridge, their buffers are known as
+        # '<name>:<full name>' (e.g. 'work:irc.freenode.#lineageos') in
+        # Filters, Channels and PrivMsgs below
+        Extra = {
+            # 'work': {
+            #     'Hostname': '',
+            #     'Password': '',
+            #     'Port': 0,
+            #     'UseSSL': False,
+            # },
+        }
+
+        # Relay events are handled by a fixed pool of workers, events of
+        # a single buffer are always handled in order
+        Workers = 8
+
+        # Maximum number of queued relay events, new events are dropped
+        # once the limit is reached
+        QueueLimit = 10000
+
+        # Filters are used to /filter/ out messages based on irc_tags.
+        # Buffer names may contain wildcards (*, ?), a filter may end with
+        # nick~<regex> to match the nick of the line against a regex.
+        Filters = {
+            'irc.freenode.#lineageos': [
+                'nick_test+irc_join',
+                'nick_test+irc_quit',
+            ],
+            # 'irc.freenode.*': [
+            #     'irc_privmsg+nick~^.*bot$',
+            # ],
+        }
+
+    class Slack:
+        # https://api.slack.com/custom-integrations/legacy-tokens
+        Token = ''
+
+        # Web API base URL, RTM connects through it as well
+        ApiUrl = 'https://slack.com/api/'
+
+        # More workspaces to mirror the same WeeChat buffers into, each with
+        # a connection pool, rate limits and channel map of its own. Channels
+        # and PrivMsgs default to the ones in Global.
+        Extra = {
+            # 'mirror': {
+            #     'Token': '',
+            #     'Channels': {
+            #         'irc.freenode.#lineageos': 'lineageos',
+            #     },
+            #     'PrivMsgs': {},
+            # },
+        }
+
+        # Outgoing messages per second per channel, and how many messages
+        # may be sent in a burst before that limit kicks in
+        RateLimit = 1.0
+        RateBurst = 3
+
+        # Number of threads posting messages to Slack
+        SenderThreads = 4
+
+        # Maximum number of queued outgoing messages, join/part/quit notices
+        # are dropped first once it's reached
+        QueueLimit = 100000
+
+        # DM channels opened/closed within this many seconds are created or
+        # archived together
+        DmDebounce = 0.5
+
+        # Incoming Slack messages are handled by a fixed pool of workers,
+        # messages of a single channel are always handled in order
+        InboundWorkers = 4
+
+        # Maximum number of queued incoming Slack messages
+        InboundQueueLimit = 10000
+
+        # Messages sent from Slack are not posted back to Slack when WeeChat
+        # echoes them within this many seconds
+        EchoTtl = 30
+
+    class FileUpload:
+        Provider = 'NONE'
+
+        # Files larger than this many bytes are not uploaded
+        MaxSize = 100 * 1024 * 1024
+
+        # Number of files uploaded at the same time, and how many messages
+        # with files may wait for an upload slot
+        Workers = 2
+        QueueLimit = 100
+
+        # Uploaded files are remembered by their SHA-256 (and Slack file id),
+        # so files shared again are not uploaded again. The index is kept in
+        # CachePath (empty keeps it in memory only).
+        CachePath = 'upload_cache.json'
+        CacheSize = 10000
+        CacheTtl = 30 * 24 * 60 * 60
+
+        # see: https://github.com/luk1337/gcf-upload
+        class GcfUpload:
+            URL = ''
+            ApiKey = ''
+
+        # see: https://github.com/WeebDev/lolisafe
+        class Lolisafe:
+            URL = ''
+            Token = ''
+
+        # see: https://github.com/pomf/pomf
+        class Pomf:
+            URL = ''
+            Token = ''
+
+    class Http:
+        # Connections kept alive per host (slack.com, upload provider)
+        PoolSize = 10
+
+        # Connect/read timeout in seconds
+        Timeout = 30
+
+        # Retries on connection errors and 5xx responses
+        Retries = 3
+
+    class Journal:
+        # SQLite database keeping queued outgoing messages across Slack
+        # outages and restarts (empty disables it)
+        Path = 'outbound.sqlite3'
+
+        # Queued messages are written to disk at least this often (seconds),
+        # or as soon as this many are waiting to be written
+        FlushInterval = 0.2
+        FlushBatch = 500
+
+    class Snapshot:
+        # Buffers, DM channels and Slack channels are saved here on shutdown
+        # and every Interval seconds, so a restart doesn't need to set up
+        # everything from scratch (empty disables it)
+        Path = 'state.json'
+        Interval = 60
+
+        # Snapshots older than this many seconds are ignored
+        MaxAge = 24 * 60 * 60
+
+    class Metrics:
+        # Prometheus metrics are served on http://Host:Port/metrics (0 disables it)
+        Host = '127.0.0.1'
+        Port = 0
+
+    class Tracing:
+        # Messages that took longer than SlowThreshold seconds to get through
+        # the bridge are written to SlowPath, along with where the time went
+        # (empty disables tracing)
+        SlowPath = 'slow_traces.jsonl'
+        SlowThreshold = 2.0
+
+        # kill -USR1 <pid> starts/stops a sampling profiler, collected stacks
+        # are written to ProfilePath in the collapsed flame graph format
+        ProfilePath = 'profile.txt'
+        ProfileInterval = 0.01
+
+    class Coalescing:
+        # Join/part/quit/nick/mode messages arriving within this many seconds
+        # of each other are merged into a single notice (0 disables merging)
+        Window = 2.0
+
+        # A merged notice is never held back longer than this many seconds
+        MaxDelay = 10.0
+
+        # Maximum number of messages merged into a single notice
+        MaxBatch = 500
+
+    class Global:
+        # IRC -> Slack channel mapping
+        # BTW slack does not have '#' before channel names
+        Channels = {
+            'irc.freenode.#lineageos': 'lineageos',
+            'irc.freenode.#lineageos-dev': 'lineageos-dev',
+        }
+
+        # IRC -> Slack private messages mapping
+        PrivMsgs = {
+            'irc.freenode.': '_freenode_dm_',
+        }
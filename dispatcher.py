@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from collections import deque
+
+
+class Dispatcher:
+    name: str
+    workers: int
+    queue_limit: int
+
+    dropped: int
+
+    def __init__(self, name: str, workers: int, queue_limit: int):
+        self.name = name
+        self.workers = workers
+        self.queue_limit = queue_limit
+
+        self.dropped = 0
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+
+        # Pending events per key, and keys ready to be picked up by a worker.
+        # A key is never in `_ready` while a worker is processing it, which is
+        # what keeps events for the same key in order.
+        self._queues = {}
+        self._ready = deque()
+        self._busy = set()
+        self._pending = 0
+
+        self._stopped = False
+        self._threads = []
+        self._last_drop_report = 0
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'{self.name}-{i}', daemon=True)
+            thread.start()
+
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+        for thread in self._threads:
+            thread.join(timeout)
+
+        self._threads = []
+
+    def submit(self, key, f: callable, *args):
+        with self._cond:
+            if self._stopped:
+                return False
+
+            if self._pending >= self.queue_limit:
+                self.dropped += 1
+                self._report_drop()
+                return False
+
+            queue = self._queues.get(key)
+
+            if queue is None:
+                queue = self._queues[key] = deque()
+
+                if key not in self._busy:
+                    self._ready.append(key)
+                    self._cond.notify()
+
+            queue.append((f, args))
+            self._pending += 1
+
+        return True
+
+    def pending(self):
+        with self._lock:
+            return self._pending
+
+    def _report_drop(self):
+        # Called with the lock held, don't flood the log while shedding load
+        now = time.monotonic()
+
+        if now - self._last_drop_report >= 5:
+            self._last_drop_report = now
+            logging.warning(f'{self.name}: queue limit of {self.queue_limit} reached, '
+                            f'{self.dropped} event(s) dropped so far')
+
+    def _next(self):
+        with self._cond:
+            while not self._ready and not self._stopped:
+                self._cond.wait()
+
+            # Whatever was queued before stop() is still handled. Keys being processed
+            # are picked up again by the worker handling them, see _done
+            if not self._ready:
+                return None, None
+
+            key = self._ready.popleft()
+            queue = self._queues[key]
+            item = queue.popleft()
+
+            if not queue:
+                del self._queues[key]
+
+            self._busy.add(key)
+            self._pending -= 1
+
+            return key, item
+
+    def _done(self, key):
+        with self._cond:
+            self._busy.discard(key)
+
+            if key in self._queues:
+                self._ready.append(key)
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            key, item = self._next()
+
+            if item is None:
+                return
+
+            f, args = item
+
+            try:
+                f(*args)
+            except Exception:
+                logging.exception(f'{self.name}: unhandled exception while processing event')
+            finally:
+                self._done(key)
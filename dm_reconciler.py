@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+
+
+class DmChannelReconciler:
+    ensure: callable
+    archive: callable
+    debounce: float
+
+    def __init__(self, ensure: callable, archive: callable, debounce: float):
+        self.ensure = ensure
+        self.archive = archive
+        self.debounce = debounce
+
+        self._cond = threading.Condition()
+        self._desired = set()
+        self._applied = set()
+        self._ready = {}
+        self._deadline = None
+
+        self._apply_lock = threading.Lock()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='dm-reconciler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+        if self._thread is not None:
+            self._thread.join()
+
+    def _event(self, channel: str):
+        # Called with the lock held
+        if channel not in self._ready:
+            self._ready[channel] = threading.Event()
+
+        return self._ready[channel]
+
+    def _schedule(self):
+        # Called with the lock held, open/close bursts are applied together
+        if self._deadline is None:
+            self._deadline = time.monotonic() + self.debounce
+            self._cond.notify()
+
+    def set_desired(self, channels: list):
+        with self._cond:
+            self._desired = set(channels)
+            self._schedule()
+
+    def add(self, channel: str):
+        with self._cond:
+            if channel not in self._desired:
+                logging.info(f'Adding DM channel: {channel}')
+
+                self._desired.add(channel)
+                self._schedule()
+
+    def remove(self, channel: str):
+        with self._cond:
+            if channel in self._desired:
+                logging.info(f'Closing DM channel: {channel}')
+
+                self._desired.discard(channel)
+                self._event(channel).clear()
+                self._schedule()
+
+    def channels(self):
+        with self._cond:
+            return sorted(self._desired)
+
+    def applied(self):
+        with self._cond:
+            return sorted(self._applied)
+
+    def seed(self, channels: list):
+        # Channels that existed on Slack's side during the previous run
+        with self._cond:
+            self._applied = set(channels)
+
+            for channel in self._applied:
+                self._event(channel).set()
+
+    def forget(self, channels: list):
+        # Applied channels that turned out to be gone (archived, deleted) after all
+        with self._cond:
+            for channel in channels:
+                self._applied.discard(channel)
+                self._event(channel).clear()
+
+            self._schedule()
+
+    def wait_for(self, channel: str, timeout: float = 5):
+        self.add(channel)
+
+        with self._cond:
+            event = self._event(channel)
+
+        return event.wait(timeout)
+
+    def apply(self):
+        with self._apply_lock:
+            with self._cond:
+                self._deadline = None
+
+                to_create = self._desired - self._applied
+                to_archive = self._applied - self._desired
+
+                # Closed and reopened before the previous apply, nothing to do on Slack's side
+                for channel in self._desired & self._applied:
+                    self._event(channel).set()
+
+            for channel in sorted(to_create):
+                if self.ensure(channel):
+                    with self._cond:
+                        self._applied.add(channel)
+
+                        if channel in self._desired:
+                            self._event(channel).set()
+
+            for channel in sorted(to_archive):
+                self.archive(channel)
+
+                with self._cond:
+                    self._applied.discard(channel)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped and (self._deadline is None or self._deadline > time.monotonic()):
+                    self._cond.wait(None if self._deadline is None else self._deadline - time.monotonic())
+
+                if self._stopped:
+                    return
+
+            try:
+                self.apply()
+            except Exception:
+                logging.exception('Failed to reconcile DM channels')
@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import deque
+
+
+class EchoIndex:
+    # Pending echoes kept per buffer, the oldest ones are forgotten first
+    MAX_ENTRIES = 1000
+
+    # WeeChat only splits lines that don't fit into a 512 byte IRC message, along with
+    # the command, channel and our own nick!user@host. Anything shorter must match exactly.
+    MIN_SPLIT_BYTES = 300
+
+    ttl: float
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+
+        # buffer -> [[normalized text, expires], ...], oldest first
+        self._entries = {}
+
+    @staticmethod
+    def normalize(text: str):
+        return ' '.join(text.split())
+
+    def add(self, buffer: str, text: str):
+        text = EchoIndex.normalize(text)
+
+        if not text:
+            return
+
+        now = time.monotonic()
+
+        with self._lock:
+            entries = self._entries.setdefault(buffer, deque(maxlen=EchoIndex.MAX_ENTRIES))
+
+            self._expire(entries, now)
+            entries.append([text, now + self.ttl])
+
+    def match(self, buffer: str, text: str):
+        # Consumes the entry the echo belongs to, a long message comes back
+        # split into several lines which are folded into the same entry
+        text = EchoIndex.normalize(text)
+
+        if not text:
+            return False
+
+        now = time.monotonic()
+
+        with self._lock:
+            entries = self._entries.get(buffer)
+
+            if entries is None:
+                return False
+
+            self._expire(entries, now)
+
+            for entry in entries:
+                if entry[0] == text:
+                    entries.remove(entry)
+                    break
+
+                if len(text.encode()) >= EchoIndex.MIN_SPLIT_BYTES and entry[0].startswith(text):
+                    entry[0] = entry[0][len(text):].lstrip()
+                    break
+            else:
+                entry = None
+
+            if not entries:
+                del self._entries[buffer]
+
+            return entry is not None
+
+    def _expire(self, entries: deque, now: float):
+        while entries and entries[0][1] <= now:
+            entries.popleft()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(entries) for entries in self._entries.values())
@@ -1,9 +1,13 @@
+import hashlib
 import http
+import tempfile
 from enum import Enum
 
-import requests
-
 from config import Config
+from http_transport import HttpTransport
+from metrics import Metrics
+from multipart_stream import MultipartStream, UploadAborted
+from upload_cache import UploadCache
 
 
 class FileUploadProvider(Enum):
@@ -22,15 +26,21 @@ class FileUploadProvider(Enum):
 
 class FileUpload:
     @staticmethod
-    def _handle_none(buffer: str):
+    def _handle_none(filename: str, chunks, size: int, mime: str):
         return False, 'Uploading files is not enabled.'
 
     @staticmethod
-    def _handle_gcf_upload(filename: str, buffer: str, mime: str):
+    def _post(url: str, field: str, filename: str, chunks, size: int, mime: str, headers: dict):
+        # The file is passed through chunk by chunk instead of being loaded into memory
+        body = MultipartStream(field, filename, mime, chunks, size)
+
+        return HttpTransport.shared().post(url, data=body, headers={'Content-Type': body.content_type, **headers})
+
+    @staticmethod
+    def _handle_gcf_upload(filename: str, chunks, size: int, mime: str):
         try:
-            response = requests.post(f'{Config.FileUpload.GcfUpload.URL}/put',
-                                     files={'file': (filename, buffer, mime)},
-                                     headers={'X-Api-Key': Config.FileUpload.GcfUpload.ApiKey})
+            response = FileUpload._post(f'{Config.FileUpload.GcfUpload.URL}/put', 'file', filename, chunks, size, mime,
+                                        {'X-Api-Key': Config.FileUpload.GcfUpload.ApiKey})
         except Exception as e:
             return False, f'Failed to upload file ({e})'
 
@@ -40,11 +50,10 @@ class FileUpload:
         return True, response.url
 
     @staticmethod
-    def _handle_lolisafe(filename: str, buffer: str, mime: str):
+    def _handle_lolisafe(filename: str, chunks, size: int, mime: str):
         try:
-            request = requests.post(f'{Config.FileUpload.Lolisafe.URL}/api/upload',
-                                    files={'files[]': (filename, buffer, mime)},
-                                    headers={'token': Config.FileUpload.Lolisafe.Token})
+            request = FileUpload._post(f'{Config.FileUpload.Lolisafe.URL}/api/upload', 'files[]', filename, chunks, size,
+                                       mime, {'token': Config.FileUpload.Lolisafe.Token})
         except Exception as e:
             return False, f'Failed to upload file ({e})'
 
@@ -64,11 +73,10 @@ class FileUpload:
         return True, files[0].get('url')
 
     @staticmethod
-    def _handle_pomf(filename: str, buffer: str, mime: str):
+    def _handle_pomf(filename: str, chunks, size: int, mime: str):
         try:
-            request = requests.post(f'{Config.FileUpload.Pomf.URL}/upload.php',
-                                    files={'files[]': (filename, buffer, mime)},
-                                    headers={'token': Config.FileUpload.Pomf.Token})
+            request = FileUpload._post(f'{Config.FileUpload.Pomf.URL}/upload.php', 'files[]', filename, chunks, size,
+                                       mime, {'token': Config.FileUpload.Pomf.Token})
         except Exception as e:
             return False, f'Failed to upload file ({e})'
 
@@ -88,12 +96,79 @@ class FileUpload:
         return True, files[0].get('url')
 
     @staticmethod
-    def upload(filename: str, buffer: str, mime: str):
+    def _spool(chunks, spool, limit: int):
+        # Writes the file to disk while hashing it, memory use stays constant
+        digest = hashlib.sha256()
+        size = 0
+
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+
+                if size > limit:
+                    raise UploadAborted(f'file is larger than {limit} bytes')
+
+                digest.update(chunk)
+                spool.write(chunk)
+        finally:
+            chunks.close()
+
+        spool.seek(0)
+
+        return digest.hexdigest(), size
+
+    @staticmethod
+    def upload(filename: str, chunks, size: int, mime: str, file_id: str = None):
+        provider = FileUploadProvider.from_str(Config.FileUpload.Provider)
+
+        if provider == FileUploadProvider.NONE or size > Config.FileUpload.MaxSize:
+            # Nothing has been downloaded yet, chunks is expected to be lazy
+            chunks.close()
+
+            if provider == FileUploadProvider.NONE:
+                return FileUpload._handle_none(filename, chunks, size, mime)
+
+            return False, f'Failed to upload file ({filename} is {size} bytes, limit is {Config.FileUpload.MaxSize})'
+
+        cache = UploadCache.shared()
+        keys = []
+
+        # The same Slack file shared again, no need to download it at all
+        if file_id is not None:
+            keys.append(f'{provider.name}:slack:{file_id}')
+
+            url = cache.get(*keys, count_miss=False)
+
+            if url is not None:
+                chunks.close()
+                return True, url
+
         providers = {
-            FileUploadProvider.NONE: FileUpload._handle_none,
             FileUploadProvider.GCF_UPLOAD: FileUpload._handle_gcf_upload,
             FileUploadProvider.LOLISAFE: FileUpload._handle_lolisafe,
             FileUploadProvider.POMF: FileUpload._handle_pomf,
         }
 
-        return providers[FileUploadProvider.from_str(Config.FileUpload.Provider)](filename, buffer, mime)
+        with tempfile.TemporaryFile() as spool:
+            try:
+                sha256, size = FileUpload._spool(chunks, spool, Config.FileUpload.MaxSize)
+            except Exception as e:
+                return False, f'Failed to upload file ({e})'
+
+            keys.append(f'{provider.name}:sha256:{sha256}')
+
+            url = cache.get(keys[-1])
+
+            if url is not None:
+                cache.put(url, *keys)
+                return True, url
+
+            with Metrics.UPLOAD.labels(provider.name).time():
+                status, msg = providers[provider](filename, iter(lambda: spool.read(MultipartStream.CHUNK_SIZE), b''),
+                                                  size, mime)
+
+        if status:
+            Metrics.UPLOAD_BYTES.labels(provider.name).inc(size)
+            cache.put(msg, *keys)
+
+        return status, msg
@@ -0,0 +1,58 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import Config
+
+
+class HttpTransport:
+    session: requests.Session
+    timeout: float
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, pool_size: int, timeout: float, retries: int):
+        self.timeout = timeout
+
+        # Only connection errors, read errors of idempotent requests and 5xx
+        # responses are retried here, 429 is left to the caller
+        retry = Retry(total=retries,
+                      connect=retries,
+                      read=retries,
+                      status=retries,
+                      backoff_factor=0.5,
+                      status_forcelist=[500, 502, 503, 504],
+                      raise_on_status=False)
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @staticmethod
+    def shared():
+        with HttpTransport._shared_lock:
+            if HttpTransport._shared is None:
+                HttpTransport._shared = HttpTransport(Config.Http.PoolSize,
+                                                      Config.Http.Timeout,
+                                                      Config.Http.Retries)
+
+            return HttpTransport._shared
+
+    def request(self, method: str, url: str, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.session.close()
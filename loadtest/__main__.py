@@ -0,0 +1,259 @@
+import argparse
+import asyncio
+import logging
+import sys
+import threading
+import time
+
+from config import Config
+from loadtest.fake_relay import FakeRelay
+from loadtest.fake_slack import FakeSlack
+from main import WeeChatRelay2Slack
+
+PASSWORD = 'load'
+TOKEN = 'xoxp-load'
+
+# Seconds to wait for the bridge to connect to all fakes
+CONNECT_TIMEOUT = 30
+
+TICK = 0.01
+
+
+def configure(args: argparse.Namespace, relays: list, slacks: list):
+    # The load test runs against the fakes only, never the user's configuration
+    Config.Relay.Hostname = '127.0.0.1'
+    Config.Relay.Port = relays[0].port
+    Config.Relay.Password = PASSWORD
+    Config.Relay.UseSSL = False
+    Config.Relay.Filters = {}
+
+    Config.Relay.Extra = {relay_name(i): {
+        'Hostname': '127.0.0.1',
+        'Password': PASSWORD,
+        'Port': relay.port,
+        'UseSSL': False,
+    } for i, relay in enumerate(relays) if i}
+
+    Config.Slack.Token = slacks[0].token
+    Config.Slack.ApiUrl = slacks[0].api_url
+
+    # Extra workspaces mirror the main one's channels
+    Config.Slack.Extra = {workspace_name(i): {
+        'Token': slack.token,
+        'ApiUrl': slack.api_url,
+    } for i, slack in enumerate(slacks) if i}
+    Config.Slack.RateLimit = args.bridge_rate
+    Config.Slack.RateBurst = max(1, int(args.bridge_rate))
+
+    Config.FileUpload.CachePath = ''
+    Config.Journal.Path = ''
+    Config.Snapshot.Path = ''
+    Config.Tracing.SlowPath = ''
+    Config.Metrics.Port = 0
+
+    Config.Global.Channels = {namespaced: slack_channel for _, _, namespaced, slack_channel in channels(args)}
+    Config.Global.PrivMsgs = {}
+
+
+def workspace_name(i: int):
+    # The first workspace is the main one, without a name
+    return f'ws{i}' if i else ''
+
+
+def relay_name(i: int):
+    # The first relay is the main one, without a name
+    return f'relay{i}' if i else ''
+
+
+def buffers(args: argparse.Namespace):
+    return [f'irc.load.#chan{i}' for i in range(args.channels)]
+
+
+def channels(args: argparse.Namespace):
+    # (relay index, WeeChat buffer, buffer as known by the bridge, Slack channel)
+    ret = []
+
+    for i in range(args.relays):
+        for buffer in buffers(args):
+            name = buffer.rsplit('#', 1)[-1]
+
+            if i:
+                ret.append((i, buffer, f'{relay_name(i)}:{buffer}', f'{relay_name(i)}-{name}'))
+            else:
+                ret.append((i, buffer, buffer, name))
+
+    return ret
+
+
+def percentile(values: list, p: float):
+    if not values:
+        return float('nan')
+
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+async def generate(relays: list, slacks: list, args: argparse.Namespace, outbound: dict, inbound: dict,
+                   origins: dict):
+    # Text of every generated message -> when it was handed to the fake, and
+    # which workspace messages sent from Slack were sent from
+    targets = channels(args)
+    outbound_rate = len(targets) * args.rate
+    inbound_rate = len(targets) * args.inbound_rate
+
+    count = 0
+    start = time.perf_counter()
+
+    while True:
+        elapsed = time.perf_counter() - start
+
+        if elapsed >= args.duration:
+            return
+
+        # Catch up with the schedule, however late this tick is
+        while count < int(elapsed * (outbound_rate + inbound_rate)):
+            i, buffer, _, slack_channel = targets[count % len(targets)]
+            text = f'load {count}'
+
+            if count % (outbound_rate + inbound_rate) < outbound_rate:
+                outbound[text] = time.perf_counter()
+                relays[i].send_line(buffer, f'user{count % 100}', text,
+                                    ['irc_privmsg', 'notify_message', f'nick_user{count % 100}', 'log1'])
+            else:
+                origin = origins[text] = (count // len(targets)) % len(slacks)
+                inbound[text] = time.perf_counter()
+                slacks[origin].push_message(slack_channel, f'U{count % 100:08d}', text)
+
+            count += 1
+
+        await asyncio.sleep(TICK)
+
+
+def report(name: str, sent: dict, received: list, elapsed: float):
+    latencies = sorted(received_at - sent[text] for text, received_at in received if text in sent)
+    delivered = len(set(text for text, _ in received if text in sent))
+
+    print(f'{name:<12}{len(sent):>10}{delivered:>12}{len(sent) - delivered:>8}{delivered / elapsed:>12.1f}'
+          f'{percentile(latencies, 0.5) * 1000:>10.1f}{percentile(latencies, 0.99) * 1000:>10.1f}'
+          f'{(latencies[-1] if latencies else float("nan")) * 1000:>10.1f}')
+
+    return len(sent) - delivered
+
+
+def drive(app, loop: asyncio.AbstractEventLoop, relays: list, slacks: list, args: argparse.Namespace,
+          result: dict):
+    try:
+        deadline = time.monotonic() + CONNECT_TIMEOUT
+
+        while not all([relay.is_synced() for relay in relays] + [slack.is_connected() for slack in slacks]):
+            if time.monotonic() > deadline:
+                raise TimeoutError('Timed out while waiting for the bridge to connect')
+
+            time.sleep(TICK)
+
+        outbound, inbound, origins = {}, {}, {}
+        start = time.perf_counter()
+
+        asyncio.run_coroutine_threadsafe(generate(relays, slacks, args, outbound, inbound, origins), loop).result()
+
+        # Messages sent from one workspace are mirrored to all other ones
+        mirrored = [{text: sent_at for text, sent_at in inbound.items() if origins[text] != k}
+                    for k in range(len(slacks))]
+
+        deadline = time.monotonic() + args.drain
+
+        while time.monotonic() < deadline:
+            if all(len(slack.messages) >= len(outbound) + len(mirrored[k]) for k, slack in enumerate(slacks)) and \
+                    sum(len(relay.inputs) for relay in relays) >= len(inbound):
+                break
+
+            time.sleep(TICK)
+
+        elapsed = time.perf_counter() - start
+
+        print(f'{"direction":<12}{"sent":>10}{"delivered":>12}{"lost":>8}{"msgs/sec":>12}'
+              f'{"p50 ms":>10}{"p99 ms":>10}{"max ms":>10}')
+
+        failures = 0
+
+        for k, slack in enumerate(slacks):
+            received = [(text, at) for _, _, text, at in list(slack.messages)]
+            label = workspace_name(k) or 'slack'
+
+            failures += report(f'to {label}', outbound, received, elapsed)
+
+            if mirrored[k]:
+                failures += report(f'mirror {label}', mirrored[k], received, elapsed)
+
+            # Echoes of messages sent from Slack must not be posted back to the same workspace
+            echoed = sum(1 for text, _ in received if text in inbound and origins[text] == k)
+            failures += echoed
+
+            print(f'{label}: {slack.rate_limited} chat.postMessage calls answered with HTTP 429, '
+                  f'{echoed} messages sent from it were posted back')
+
+        if inbound:
+            # Input meant for another relay ends up in a buffer the relay doesn't know
+            received = [(text, at) for relay in relays for buffer, text, at in list(relay.inputs)
+                        if buffer in relay.pointers]
+
+            failures += report('to relay', inbound, received, elapsed)
+
+        result['failures'] = failures
+    except Exception:
+        logging.exception('Load test failed')
+    finally:
+        app.runtime.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python3 -m loadtest',
+                                     description='Drive the bridge with a fake WeeChat Relay and a fake Slack')
+    parser.add_argument('--relays', type=int, default=1, help='number of WeeChat relays')
+    parser.add_argument('--workspaces', type=int, default=1, help='number of Slack workspaces')
+    parser.add_argument('--channels', type=int, default=10, help='number of bridged channels per relay')
+    parser.add_argument('--rate', type=int, default=5, help='WeeChat lines per second per channel')
+    parser.add_argument('--inbound-rate', type=int, default=0, help='Slack messages per second per channel')
+    parser.add_argument('--duration', type=float, default=10, help='seconds to generate load for')
+    parser.add_argument('--drain', type=float, default=30,
+                        help='seconds to wait for the bridge to deliver everything afterwards')
+    parser.add_argument('--slack-limit', type=int, default=0,
+                        help='chat.postMessage calls per second per channel before Slack answers 429 (0: unlimited)')
+    parser.add_argument('--bridge-rate', type=float, default=1000,
+                        help='Slack.RateLimit of the bridge, outgoing messages per second per channel')
+    parser.add_argument('--verbose', action='store_true', help='show the bridge logs')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='[%(asctime)s] %(message)s')
+
+    # The fakes get an event loop of their own, the bridge runs in the main thread like it does for real
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name='loadtest-fakes', daemon=True).start()
+
+    relays = [FakeRelay(PASSWORD, buffers(args)) for _ in range(args.relays)]
+    slacks = [FakeSlack(f'{TOKEN}-{i}', args.slack_limit) for i in range(args.workspaces)]
+
+    for fake in relays + slacks:
+        asyncio.run_coroutine_threadsafe(fake.start(), loop).result()
+
+    configure(args, relays, slacks)
+
+    app = WeeChatRelay2Slack()
+    result = {}
+
+    driver = threading.Thread(target=drive, args=(app, loop, relays, slacks, args, result), name='loadtest-driver')
+    driver.start()
+
+    app.run()
+    driver.join()
+
+    for fake in slacks + relays:
+        asyncio.run_coroutine_threadsafe(fake.stop(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+
+    if result.get('failures', 1):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
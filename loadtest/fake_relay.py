@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import re
+import struct
+import time
+
+
+class RelayProtocol:
+    # Encoders for the WeeChat Relay binary protocol, see
+    # https://weechat.org/files/doc/stable/weechat_relay_protocol.en.html
+
+    @staticmethod
+    def int(value: int):
+        return struct.pack('>i', value)
+
+    @staticmethod
+    def chr(value: int):
+        return bytes([value])
+
+    @staticmethod
+    def str(value: str):
+        if value is None:
+            return b'\xff\xff\xff\xff'
+
+        data = value.encode()
+
+        return struct.pack('>I', len(data)) + data
+
+    @staticmethod
+    def ptr(value: str):
+        return bytes([len(value)]) + value.encode()
+
+    @staticmethod
+    def tim(value: float):
+        data = str(int(value)).encode()
+
+        return bytes([len(data)]) + data
+
+    @staticmethod
+    def arr(item_type: str, values: list):
+        encode = getattr(RelayProtocol, item_type)
+
+        return item_type.encode() + struct.pack('>I', len(values)) + b''.join(encode(value) for value in values)
+
+    @staticmethod
+    def hda(hpath: str, keys: list, items: list):
+        # keys: [(name, type)], items: [(pointers, {name: value})], arrays are passed encoded
+        data = [RelayProtocol.str(hpath),
+                RelayProtocol.str(','.join(f'{name}:{key_type}' for name, key_type in keys)),
+                struct.pack('>I', len(items))]
+
+        for pointers, values in items:
+            data.extend(RelayProtocol.ptr(pointer) for pointer in pointers)
+
+            for name, key_type in keys:
+                value = values.get(name)
+                data.append(value if key_type == 'arr' else getattr(RelayProtocol, key_type)(value))
+
+        return b'hda' + b''.join(data)
+
+    @staticmethod
+    def message(msg_id: str, *objects: bytes):
+        # Total length, no compression, id and objects
+        body = b'\x00' + RelayProtocol.str(msg_id) + b''.join(objects)
+
+        return struct.pack('>I', len(body) + 4) + body
+
+
+class FakeRelay:
+    # "(id) command arguments"
+    COMMAND_RE = re.compile(r'^(?:\((?P<id>[^)]*)\) )?(?P<command>\S+) ?(?P<args>.*)$')
+
+    BUFFER_KEYS = {
+        'number': 'int',
+        'full_name': 'str',
+        'short_name': 'str',
+        'name': 'str',
+    }
+
+    LINE_KEYS = [
+        ('buffer', 'ptr'),
+        ('date', 'tim'),
+        ('date_printed', 'tim'),
+        ('displayed', 'chr'),
+        ('highlight', 'chr'),
+        ('tags_array', 'arr'),
+        ('prefix', 'str'),
+        ('message', 'str'),
+    ]
+
+    # Our own nick, whatever is sent through input comes back from it
+    NICK = 'weerelay2slack'
+
+    password: str
+
+    def __init__(self, password: str, buffers: list):
+        self.password = password
+
+        # Fake pointers, bare hex like the real thing
+        self.buffers = {f'{0x10000 + i * 0x100:x}': full_name for i, full_name in enumerate(buffers)}
+        self.pointers = {full_name: pointer for pointer, full_name in self.buffers.items()}
+
+        # (buffer full name, message, time.perf_counter()) of every input received
+        self.inputs = []
+
+        self.port = None
+
+        self._server = None
+        self._synced = set()
+        self._line_pointers = iter(range(0x1000000, 0x7fffffff))
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0):
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+
+        for writer in list(self._synced):
+            writer.close()
+
+        await self._server.wait_closed()
+
+    def is_synced(self):
+        return bool(self._synced)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        authenticated = False
+
+        try:
+            while True:
+                line = await reader.readline()
+
+                if not line:
+                    break
+
+                match = FakeRelay.COMMAND_RE.match(line.decode().rstrip('\r\n'))
+
+                if match is None:
+                    continue
+
+                msg_id, command, args = match.group('id') or '', match.group('command'), match.group('args')
+
+                if command == 'init':
+                    options = dict(option.split('=', 1) for option in args.split(',') if '=' in option)
+
+                    # WeeChat just hangs up on a wrong password
+                    if options.get('password') != self.password:
+                        break
+
+                    authenticated = True
+                elif not authenticated:
+                    break
+                elif command == 'ping':
+                    writer.write(RelayProtocol.message('_pong', b'str' + RelayProtocol.str(args)))
+                elif command == 'hdata':
+                    writer.write(self._hdata(msg_id, args))
+                elif command == 'sync':
+                    self._synced.add(writer)
+                elif command == 'input':
+                    buffer, _, message = args.partition(' ')
+                    self.inputs.append((buffer, message, time.perf_counter()))
+
+                    if buffer in self.pointers:
+                        self._echo(buffer, message)
+                elif command == 'quit':
+                    break
+
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._synced.discard(writer)
+            writer.close()
+
+    def _hdata(self, msg_id: str, args: str):
+        path, _, fields = args.partition(' ')
+
+        if path != 'buffer:gui_buffers(*)':
+            logging.warning(f'Fake relay: unsupported hdata request {args}')
+            return RelayProtocol.message(msg_id, b'hda' + RelayProtocol.str(None))
+
+        keys = [(field, FakeRelay.BUFFER_KEYS[field]) for field in (fields.split(',') if fields else
+                                                                     FakeRelay.BUFFER_KEYS)]
+        items = []
+
+        for number, (pointer, full_name) in enumerate(self.buffers.items(), 1):
+            values = {
+                'number': number,
+                'full_name': full_name,
+                'short_name': full_name.rsplit('.', 1)[-1],
+                'name': full_name.split('.', 1)[-1],
+            }
+
+            items.append(([pointer], values))
+
+        return RelayProtocol.message(msg_id, RelayProtocol.hda('buffer', keys, items))
+
+    def _echo(self, full_name: str, message: str):
+        tags = ['irc_privmsg', 'self_msg', 'notify_none', 'no_highlight', f'nick_{FakeRelay.NICK}', 'log1']
+
+        if message.startswith('/me '):
+            self.send_line(full_name, ' *', f'{FakeRelay.NICK} {message[len("/me "):]}', ['irc_action'] + tags)
+        else:
+            self.send_line(full_name, FakeRelay.NICK, message, tags)
+
+    def send_line(self, full_name: str, prefix: str, message: str, tags: list, highlight: bool = False):
+        now = time.time()
+
+        frame = RelayProtocol.message('_buffer_line_added', RelayProtocol.hda('line_data', FakeRelay.LINE_KEYS, [(
+            [f'{next(self._line_pointers):x}'],
+            {
+                'buffer': self.pointers[full_name],
+                'date': now,
+                'date_printed': now,
+                'displayed': 1,
+                'highlight': 1 if highlight else 0,
+                'tags_array': RelayProtocol.arr('str', tags),
+                'prefix': prefix,
+                'message': message,
+            },
+        )]))
+
+        for writer in self._synced:
+            writer.write(frame)
@@ -0,0 +1,225 @@
+import asyncio
+import itertools
+import json
+import time
+from collections import defaultdict
+from urllib.parse import parse_qsl
+
+from aiohttp import web
+
+
+class FakeSlack:
+    # Just enough of the Web API and RTM for the bridge, see https://api.slack.com/methods
+
+    token: str
+    rate_limit: int
+
+    def __init__(self, token: str, rate_limit: int = 0):
+        self.token = token
+
+        # chat.postMessage calls allowed per channel per second (0 is unlimited)
+        self.rate_limit = rate_limit
+
+        self.port = None
+
+        # id -> channel
+        self.channels = {}
+
+        # (channel name, username, text, time.perf_counter()) of every message posted
+        self.messages = []
+
+        self.rate_limited = 0
+        self.calls = defaultdict(int)
+
+        self._ids = itertools.count(1)
+        self._ts = itertools.count(1)
+        self._windows = {}
+        self._websockets = set()
+        self._runner = None
+
+        self._create('general', is_general=True)
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0):
+        app = web.Application()
+        app.router.add_route('*', '/api/{method}', self._handle)
+        app.router.add_get('/rtm', self._rtm)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+
+        await web.TCPSite(self._runner, host, port).start()
+
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        for websocket in list(self._websockets):
+            await websocket.close()
+
+        await self._runner.cleanup()
+
+    @property
+    def api_url(self):
+        return f'http://127.0.0.1:{self.port}/api/'
+
+    def is_connected(self):
+        return bool(self._websockets)
+
+    def _create(self, name: str, is_general: bool = False):
+        channel = {
+            'id': f'C{next(self._ids):08X}',
+            'name': name,
+            'is_channel': True,
+            'is_archived': False,
+            'is_general': is_general,
+            'created': int(time.time()),
+        }
+
+        self.channels[channel['id']] = channel
+
+        return channel
+
+    def _find(self, channel: str):
+        # Like Slack, chat.* accept a channel name as well as an id
+        if channel in self.channels:
+            return self.channels[channel]
+
+        for candidate in self.channels.values():
+            if candidate['name'] == channel.lstrip('#'):
+                return candidate
+
+        return None
+
+    def _is_rate_limited(self, channel_id: str):
+        if not self.rate_limit:
+            return False
+
+        second = int(time.monotonic())
+        window, count = self._windows.get(channel_id, (second, 0))
+
+        if window != second:
+            window, count = second, 0
+
+        self._windows[channel_id] = (window, count + 1)
+
+        return count >= self.rate_limit
+
+    async def _handle(self, request: web.Request):
+        method = request.match_info['method']
+        self.calls[method] += 1
+
+        # requests sends form data even with GET
+        args = dict(request.query)
+        args.update(parse_qsl(await request.text()))
+
+        if request.headers.get('Authorization') != f'Bearer {self.token}' and args.get('token') != self.token:
+            return web.json_response({'ok': False, 'error': 'invalid_auth'})
+
+        handler = getattr(self, '_' + method.replace('.', '_'), None)
+
+        if handler is None:
+            return web.json_response({'ok': False, 'error': 'unknown_method'})
+
+        return handler(request, args)
+
+    def _auth_test(self, request: web.Request, args: dict):
+        return web.json_response({'ok': True, 'user': 'weerelay2slack', 'user_id': 'UBRIDGE', 'team_id': 'TLOAD'})
+
+    def _channels_list(self, request: web.Request, args: dict):
+        channels = list(self.channels.values())
+
+        start = int(args.get('cursor') or 0)
+        end = start + int(args.get('limit') or 100)
+
+        return web.json_response({
+            'ok': True,
+            'channels': channels[start:end],
+            'response_metadata': {'next_cursor': str(end) if end < len(channels) else ''},
+        })
+
+    def _channels_create(self, request: web.Request, args: dict):
+        if self._find(args.get('name', '')) is not None:
+            return web.json_response({'ok': False, 'error': 'name_taken'})
+
+        channel = self._create(args.get('name', ''))
+        self._push({'type': 'channel_created', 'channel': channel})
+
+        return web.json_response({'ok': True, 'channel': channel})
+
+    def _set_archived(self, args: dict, is_archived: bool):
+        channel = self.channels.get(args.get('channel'))
+
+        if channel is None:
+            return web.json_response({'ok': False, 'error': 'channel_not_found'})
+
+        channel['is_archived'] = is_archived
+        self._push({'type': 'channel_archive' if is_archived else 'channel_unarchive', 'channel': channel['id']})
+
+        return web.json_response({'ok': True})
+
+    def _channels_archive(self, request: web.Request, args: dict):
+        return self._set_archived(args, True)
+
+    def _channels_unarchive(self, request: web.Request, args: dict):
+        return self._set_archived(args, False)
+
+    def _chat_postMessage(self, request: web.Request, args: dict):
+        channel = self._find(args.get('channel', ''))
+
+        if channel is None:
+            return web.json_response({'ok': False, 'error': 'channel_not_found'})
+
+        if channel['is_archived']:
+            return web.json_response({'ok': False, 'error': 'is_archived'})
+
+        if self._is_rate_limited(channel['id']):
+            self.rate_limited += 1
+            return web.json_response({'ok': False, 'error': 'ratelimited'}, status=429, headers={'Retry-After': '1'})
+
+        self.messages.append((channel['name'], args.get('username'), args.get('text'), time.perf_counter()))
+
+        return web.json_response({'ok': True, 'channel': channel['id'], 'ts': self._next_ts()})
+
+    def _chat_delete(self, request: web.Request, args: dict):
+        return web.json_response({'ok': True, 'channel': args.get('channel'), 'ts': args.get('ts')})
+
+    def _rtm_connect(self, request: web.Request, args: dict):
+        return web.json_response({
+            'ok': True,
+            'url': f'ws://{request.host}/rtm',
+            'self': {'id': 'UBRIDGE', 'name': 'weerelay2slack'},
+            'team': {'id': 'TLOAD', 'name': 'load', 'domain': 'load'},
+        })
+
+    def _next_ts(self):
+        return f'{int(time.time())}.{next(self._ts):06d}'
+
+    async def _rtm(self, request: web.Request):
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+
+        await websocket.send_str(json.dumps({'type': 'hello'}))
+        self._websockets.add(websocket)
+
+        try:
+            # The bridge never sends anything over RTM, just wait for it to hang up
+            async for _ in websocket:
+                pass
+        finally:
+            self._websockets.discard(websocket)
+
+        return websocket
+
+    def _push(self, event: dict):
+        data = json.dumps(event)
+
+        for websocket in self._websockets:
+            asyncio.ensure_future(websocket.send_str(data))
+
+    def push_message(self, channel: str, user: str, text: str):
+        # A message typed by a Slack user, as delivered over RTM
+        channel = self._find(channel)
+        ts = self._next_ts()
+
+        self._push({'type': 'message', 'channel': channel['id'], 'user': user, 'text': text, 'ts': ts})
+
+        return ts
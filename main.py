@@ -1,165 +1,312 @@
 #!/usr/bin/env python3
+import functools
 import logging
-import threading
+import signal
+import time
 
 from config import Config
+from dispatcher import Dispatcher
+from metrics import Metrics, MetricsServer
+from notice_coalescer import NoticeCoalescer
+from outbound_scheduler import Priority
 from relay_client import RelayClient
-from slack_client import SlackClient
+from runtime import Runtime
+from state_snapshot import StateSnapshot
+from tag_filter import TagFilter
+from tracing import NULL_TRACE, SamplingProfiler
 from utils import Utils
+from workspace import Workspace
 
 
 class WeeChatRelay2Slack:
-    relay_client: RelayClient
-    slack_client: SlackClient
+    GENERIC_SERVER_MSG_TAGS = frozenset({'irc_401',
+                                         'irc_402',
+                                         'irc_join',
+                                         'irc_kick',
+                                         'irc_mode',
+                                         'irc_nick',
+                                         'irc_nick_back',
+                                         'irc_part',
+                                         'irc_topic',
+                                         'irc_quit'})
 
-    # Slack <> WeeChat channel map
-    s2w_dm_channels_map = {}
+    runtime: Runtime
+
+    # Relay name -> client, the main relay has no name
+    relays: dict
+
+    # Workspace name -> Slack workspace, every line is parsed once and sent to all of them
+    workspaces: dict
+
+    dispatcher: Dispatcher
+    coalescer: NoticeCoalescer
+
+    filters: TagFilter
+
+    snapshot: StateSnapshot
+
+    profiler: SamplingProfiler
 
     def __init__(self):
-        self.relay_client = RelayClient()
-        self.relay_client.set_on_buffer_line_added_callback(self._on_buffer_line_added)
-        self.relay_client.set_on_buffer_opened_callback(self._on_buffer_opened)
-        self.relay_client.set_on_buffer_closing_callback(self._on_buffer_closing)
-        self.relay_client.set_on_post_setup_buffers_callback(self._on_post_setup_buffers)
-        self.relay_client.init()
-
-        self.slack_client = SlackClient()
-        self.slack_client.set_message_callback(self._on_slack_message)
-        self.slack_client.create_dm_channels([buffer for _, buffer in self.relay_client.get_direct_message_buffers()],
-                                             self.s2w_dm_channels_map)
-
-    def _on_buffer_line_added(self, response: dict, run_async: bool = False):
-        if not run_async:
-            threading.Thread(target=self._on_buffer_line_added, args=(response, True)).start()
-            return
+        self.runtime = Runtime()
+
+        # kill -USR1 <pid> to start/stop profiling
+        self.profiler = SamplingProfiler(Config.Tracing.ProfilePath, Config.Tracing.ProfileInterval)
+        self.runtime.on_signal(signal.SIGUSR1, self.profiler.toggle)
+
+        self.snapshot = StateSnapshot(Config.Snapshot.Path, Config.Snapshot.Interval, Config.Snapshot.MaxAge,
+                                      self._collect_state)
+        state = self.snapshot.load() or {}
+
+        self.workspaces = {workspace.name: workspace for workspace in Workspace.configured()}
+
+        for workspace in self.workspaces.values():
+            for slack_channel, weechat_channel in state.get('routing', {}).get(workspace.name, {}).items():
+                workspace.routing.add_dm(slack_channel, weechat_channel)
+
+        self.filters = TagFilter(Config.Relay.Filters)
+        self.dispatcher = Dispatcher('relay', Config.Relay.Workers, Config.Relay.QueueLimit)
+
+        Metrics.QUEUE_DEPTH.labels('relay').set_function(self.dispatcher.pending)
+        Metrics.RELAY_EVENTS_DROPPED.set_function(lambda: self.dispatcher.dropped)
+
+        self.relays = {}
+
+        for relay in RelayClient.configured():
+            relay.set_on_buffer_line_added_callback(self._dispatch(self._on_buffer_line_added))
+            relay.set_on_buffer_opened_callback(self._dispatch(self._on_buffer_opened))
+            relay.set_on_buffer_closing_callback(self._dispatch(self._on_buffer_closing))
+            relay.set_on_post_setup_buffers_callback(functools.partial(self._on_post_setup_buffers, relay))
+            relay.init(state.get('relays', {}).get(relay.name))
+
+            self.relays[relay.name] = relay
+
+        self.coalescer = NoticeCoalescer(self._on_coalesced_notice,
+                                         Config.Coalescing.Window,
+                                         Config.Coalescing.MaxDelay,
+                                         Config.Coalescing.MaxBatch)
+
+        buffers = [buffer for relay in self.relays.values() for buffer in relay.buffers]
 
+        for workspace in self.workspaces.values():
+            slack_state = state.get('slack', {}).get(workspace.name)
+
+            workspace.connect(self.runtime.loop, slack_state)
+            workspace.slack_client.set_message_callback(functools.partial(self._on_slack_message, workspace))
+            workspace.slack_client.dm_channels.set_desired([slack_channel for _, slack_channel in
+                                                            workspace.direct_message_channels(buffers)])
+
+            # On a warm start only the difference is applied, in the background
+            if slack_state is None:
+                workspace.slack_client.dm_channels.apply()
+
+    def _collect_state(self):
+        return {
+            'relays': {name: relay.snapshot() for name, relay in self.relays.items()},
+            'slack': {name: workspace.slack_client.snapshot() for name, workspace in self.workspaces.items()},
+            'routing': {name: workspace.routing.dm_channels() for name, workspace in self.workspaces.items()},
+        }
+
+    def _dispatch(self, f: callable):
+        def submit(response: dict):
+            # Events of a single buffer are handled in order, different buffers in parallel
+            if 'buffer' in response:
+                key = response.get('buffer', '')
+            else:
+                key = response.get('__path', [''])[0]
+
+            # Pointers are only unique within a single WeeChat
+            self.dispatcher.submit((response.get('__relay', ''), key), f, response)
+
+        return submit
+
+    def _on_buffer_line_added(self, response: dict):
         buffer_pointer = response.get('buffer', '')
         message = response.get('message', '')
         tags_array = response.get('tags_array', [])
 
-        is_generic_server_msg = bool({'irc_401',
-                                      'irc_402',
-                                      'irc_join',
-                                      'irc_kick',
-                                      'irc_mode',
-                                      'irc_nick',
-                                      'irc_nick_back',
-                                      'irc_part',
-                                      'irc_topic',
-                                      'irc_quit'} & set(tags_array))
+        trace = response.get('__trace', NULL_TRACE)
+        trace.end('relay_queue')
+
+        # WeeChat puts the IRC command (irc_privmsg, irc_join, ...) first
+        Metrics.RELAY_LINES.labels(tags_array[0] if tags_array else 'none').inc()
+
+        is_generic_server_msg = not WeeChatRelay2Slack.GENERIC_SERVER_MSG_TAGS.isdisjoint(tags_array)
         is_privmsg = 'irc_privmsg' in tags_array
 
         if not any((is_generic_server_msg, is_privmsg)):
+            trace.finish(outcome='ignored')
             return
 
-        if buffer_pointer.startswith('gui_'):
-            buffer = self.relay_client.wait_for_buffer_by_pointer(buffer_pointer)
-        else:
-            buffer = self.relay_client.wait_for_buffer_by_pointer(f'0x{buffer_pointer}')
+        started = time.perf_counter()
+
+        with trace.span('buffer_wait'):
+            buffer = self.relays[response.get('__relay', '')].wait_for_buffer_by_pointer(buffer_pointer)
+
+        Metrics.BUFFER_WAIT.observe(time.perf_counter() - started)
 
         if buffer is None:
             logging.error(f'Timed out while waiting for buffer {buffer_pointer}')
+            trace.finish(outcome='unknown_buffer')
             return
 
-        if buffer.full_name in Config.Relay.Filters:
-            for filter_tags in Config.Relay.Filters[buffer.full_name]:
-                if all(x in tags_array for x in filter_tags.split('+')):
-                    return
+        with trace.span('filter'):
+            is_filtered = self.filters.match(buffer.full_name, tags_array)
 
-        buffer_name, msg = buffer.full_name, Utils.weechat_string_remove_color(message)
+        if is_filtered:
+            Metrics.RELAY_LINES_FILTERED.inc()
+            trace.finish(outcome='filtered')
+            return
 
-        if buffer_name not in Config.Global.Channels:
-            buffer_name = Utils.get_slack_direct_message_channel_for_buffer(buffer_name)
+        started = time.perf_counter()
 
-            if buffer_name is not None:
-                self.slack_client.wait_for_dm_channel(buffer_name)
-        else:
-            buffer_name = Config.Global.Channels[buffer_name]
+        with trace.span('remove_color'):
+            msg = Utils.weechat_string_remove_color(message)
+
+        Metrics.REMOVE_COLOR.observe(time.perf_counter() - started)
+
+        is_echo = is_privmsg and 'self_msg' in tags_array
+
+        # Actions come back as "<nick> <text>"
+        echo = msg.partition(' ')[2] if is_echo and 'irc_action' in tags_array else msg
+
+        # Parsed once, no matter how many workspaces the line goes to
+        prefix = Utils.weechat_string_remove_color(response.get('prefix', '')) if is_privmsg else ''
+
+        # Channels with private messages or highlights are served ahead of the others
+        is_highlight = response.get('highlight') == b'\x01'
+
+        # Only the first workspace a line is sent to finishes its trace, once chat.postMessage returns
+        owner = trace
+        outcome = 'unrouted'
+
+        for workspace in self.workspaces.values():
+            # Not posted back to the workspace it was sent from, still mirrored to all other ones
+            if is_echo and workspace.echoes.match(buffer.full_name, echo):
+                Metrics.RELAY_ECHOES.inc()
+
+                if outcome is not None:
+                    outcome = 'echo'
+
+                continue
+
+            with trace.span('routing'):
+                buffer_name, is_dm = self._route(workspace, buffer.full_name)
+
+            if buffer_name is None:
+                continue
 
-        if buffer_name is not None:
             if is_generic_server_msg:
-                self.slack_client.send_me_message(buffer_name, msg)
-            elif is_privmsg:
-                if 'irc_action' in tags_array:
-                    self.slack_client.send_me_message(buffer_name, msg)
-                else:
-                    prefix = Utils.weechat_string_remove_color(response.get('prefix', ''))
-                    self.slack_client.send_message(buffer_name, prefix, msg)
-
-    def _on_buffer_opened(self, response: dict, run_async: bool = False):
-        if not run_async:
-            threading.Thread(target=self._on_buffer_opened, args=(response, True)).start()
-            return
+                # Merged once for all workspaces, see _on_coalesced_notice
+                outcome = 'coalesced'
+                continue
 
-        full_name = response.get('full_name', '')
-        buffer_name = Utils.get_slack_direct_message_channel_for_buffer(full_name)
+            priority = Priority.HIGH if is_highlight or is_dm else Priority.NORMAL
+            owner.set(channel=buffer_name)
 
-        if buffer_name is None:
-            return
+            if 'irc_action' in tags_array:
+                workspace.slack_client.send_me_message(buffer_name, msg, priority, owner)
+            else:
+                workspace.slack_client.send_message(buffer_name, prefix, msg, priority, owner)
 
-        if buffer_name not in self.slack_client.last_dm_channels:
-            logging.info(f'Adding DM channel: {buffer_name}')
+            owner, outcome = NULL_TRACE, None
 
-            self.slack_client.create_dm_channels(self.slack_client.last_dm_channels + [buffer_name],
-                                                 self.s2w_dm_channels_map)
+        if outcome == 'coalesced':
+            self.coalescer.add(buffer.full_name, tags_array, msg)
 
-        self.s2w_dm_channels_map[buffer_name] = full_name
+        if outcome is not None:
+            trace.finish(outcome=outcome)
 
-    def _on_buffer_closing(self, response: dict, run_async: bool = False):
-        if not run_async:
-            threading.Thread(target=self._on_buffer_closing, args=(response, True)).start()
-            return
+    def _route(self, workspace: Workspace, full_name: str):
+        buffer_name = workspace.routing.forward.get(full_name)
+
+        if buffer_name is not None:
+            return buffer_name, False
+
+        buffer_name = workspace.routing.dm_channel_for_buffer(full_name)
+
+        if buffer_name is not None and not workspace.slack_client.dm_channels.wait_for(buffer_name):
+            logging.error(f'Timed out while waiting for DM channel {buffer_name}')
+
+        return buffer_name, buffer_name is not None
+
+    def _on_coalesced_notice(self, full_name: str, msg: str):
+        for workspace in self.workspaces.values():
+            buffer_name = workspace.routing.slack_channel_for_buffer(full_name)
 
+            if buffer_name is not None:
+                workspace.slack_client.send_me_message(buffer_name, msg, Priority.LOW)
+
+    def _on_buffer_opened(self, response: dict):
         full_name = response.get('full_name', '')
-        buffer_name = Utils.get_slack_direct_message_channel_for_buffer(full_name)
 
-        if buffer_name is None:
-            return
+        for workspace in self.workspaces.values():
+            buffer_name = workspace.routing.dm_channel_for_buffer(full_name)
 
-        if buffer_name in self.slack_client.last_dm_channels:
-            logging.info(f'Closing DM channel: {buffer_name}')
+            if buffer_name is None:
+                continue
 
-            self.slack_client.create_dm_channels([c for c in self.slack_client.last_dm_channels if c != buffer_name],
-                                                 self.s2w_dm_channels_map)
+            workspace.slack_client.dm_channels.add(buffer_name)
+            workspace.routing.add_dm(buffer_name, full_name)
+
+    def _on_buffer_closing(self, response: dict):
+        full_name = response.get('full_name', '')
 
-        if buffer_name in self.s2w_dm_channels_map:
-            del self.s2w_dm_channels_map[buffer_name]
+        for workspace in self.workspaces.values():
+            buffer_name = workspace.routing.dm_channel_for_buffer(full_name)
 
-    def _on_slack_message(self, channel: str, msg: str):
-        weechat_channel = self.s2w_dm_channels_map[channel] if channel in self.s2w_dm_channels_map else None
+            if buffer_name is None:
+                continue
+
+            workspace.slack_client.dm_channels.remove(buffer_name)
+            workspace.routing.remove_dm(buffer_name)
+
+    def _on_slack_message(self, workspace: Workspace, channel: str, msg: str):
+        weechat_channel = workspace.routing.buffer_for_slack_channel(channel)
 
         if weechat_channel is not None:
-            self.relay_client.input(weechat_channel, msg)
-        else:
-            for weechat_channel, slack_channel in Config.Global.Channels.items():
-                if slack_channel == channel:
-                    self.relay_client.input(weechat_channel, msg)
-                    break
+            # The message stays on Slack as it is, its echo from WeeChat is dropped instead
+            workspace.echoes.add(weechat_channel, msg[len('/me '):] if msg.startswith('/me ') else msg)
+            self._relay_for_buffer(weechat_channel).input(weechat_channel, msg)
 
-    def _on_post_setup_buffers(self):
-        for buffer in self.relay_client.buffers:
-            buffer_name = Utils.get_slack_direct_message_channel_for_buffer(buffer.full_name)
+    def _relay_for_buffer(self, full_name: str):
+        name, separator, _ = full_name.partition(RelayClient.NAMESPACE_SEPARATOR)
 
-            if buffer_name is not None:
-                self.s2w_dm_channels_map[buffer_name] = buffer.full_name
+        return self.relays.get(name if separator else '', self.relays[''])
+
+    def _on_post_setup_buffers(self, relay: RelayClient):
+        for workspace in self.workspaces.values():
+            for full_name, buffer_name in workspace.direct_message_channels(relay.buffers):
+                workspace.routing.add_dm(buffer_name, full_name)
 
     def run(self):
-        threads = [
-            *self.relay_client.tasks(),
-            *self.slack_client.tasks(),
-        ]
-
-        [thread.start() for thread in threads]
-
-        try:
-            [thread.join() for thread in threads]
-        except KeyboardInterrupt:
-            logging.info('Bye!')
-
-            # Kill existing threads
-            for thread in threads:
-                thread.is_alive = False
-                thread.join()
+        self.dispatcher.start()
+        self.coalescer.start()
+        self.snapshot.start()
+
+        # Relay readers and Slack RTM share a single event loop, until any of them fails or we get SIGINT/SIGTERM
+        for relay in self.relays.values():
+            self.runtime.spawn(relay.run())
+
+        for workspace in self.workspaces.values():
+            self.runtime.spawn(workspace.slack_client.run())
+
+        if Config.Metrics.Port:
+            self.runtime.spawn(MetricsServer(Config.Metrics.Host, Config.Metrics.Port).run())
+
+        self.runtime.run()
+
+        logging.info('Bye!')
+
+        # Flush pending work while Slack is still reachable
+        self.dispatcher.stop()
+        self.coalescer.stop()
+
+        for workspace in self.workspaces.values():
+            workspace.slack_client.stop()
+
+        self.snapshot.stop()
+        self.profiler.stop()
 
 
 if __name__ == '__main__':
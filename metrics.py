@@ -0,0 +1,234 @@
+import asyncio
+import bisect
+import logging
+import threading
+import time
+
+from aiohttp import web
+
+
+# Every metric ever created, in order of creation
+_METRICS = []
+
+# Updates below are deliberately not locked: they sit on the hot path of every
+# relay line, and losing an increment to a badly timed thread switch once in a
+# blue moon is fine for metrics.
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class _Function:
+    def __init__(self):
+        self.f = None
+
+    def set_function(self, f: callable):
+        self.f = f
+
+    @property
+    def value(self):
+        return self.f() if self.f is not None else 0
+
+
+class _Buckets:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+
+        self.counts = [0 for _ in range(len(buckets) + 1)]
+        self.sum = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    def __init__(self, buckets: _Buckets):
+        self.buckets = buckets
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *args):
+        self.buckets.observe(time.perf_counter() - self.start)
+
+
+class _Metric:
+    TYPE = None
+
+    name: str
+    help: str
+    labelnames: tuple
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+
+        self._lock = threading.Lock()
+        self._children = {}
+
+        # Metrics without labels skip the lookup altogether
+        self._child = self.labels() if not labelnames else None
+
+        _METRICS.append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        child = self._children.get(values)
+
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+
+        return child
+
+    def _format_labels(self, values: tuple, extra: str = None):
+        pairs = [f'{name}="{value}"' for name, value in zip(self.labelnames, values)]
+
+        if extra is not None:
+            pairs.append(extra)
+
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def _samples(self, values: tuple, child):
+        yield f'{self.name}{self._format_labels(values)} {child.value}'
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.TYPE}']
+
+        with self._lock:
+            children = sorted(self._children.items())
+
+        for values, child in children:
+            lines.extend(self._samples(values, child))
+
+        return lines
+
+
+class Counter(_Metric):
+    TYPE = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self._child.inc(amount)
+
+
+class Gauge(_Metric):
+    TYPE = 'gauge'
+
+    def _new_child(self):
+        return _Function()
+
+    def set_function(self, f: callable):
+        self._child.set_function(f)
+
+
+class Histogram(_Metric):
+    TYPE = 'histogram'
+
+    DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value: float):
+        self._child.observe(value)
+
+    def time(self):
+        return self._child.time()
+
+    def _samples(self, values: tuple, child):
+        counts, total = list(child.counts), child.sum
+
+        cumulative = 0
+
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += count
+            le = f'le="{bound}"'
+
+            yield f'{self.name}_bucket{self._format_labels(values, le)} {cumulative}'
+
+        yield f'{self.name}_sum{self._format_labels(values)} {total}'
+        yield f'{self.name}_count{self._format_labels(values)} {cumulative}'
+
+
+class Metrics:
+    RELAY_EVENTS = Counter('relay_events_total', 'Events received from WeeChat Relay', ('event',))
+    RELAY_LINES = Counter('relay_lines_total', 'Buffer lines received from WeeChat Relay by IRC tag', ('tag',))
+    RELAY_LINES_FILTERED = Counter('relay_lines_filtered_total', 'Buffer lines dropped by Relay.Filters')
+    RELAY_ECHOES = Counter('relay_echoes_total', 'Buffer lines dropped as echoes of messages sent from Slack')
+    RELAY_EVENTS_DROPPED = Gauge('relay_events_dropped', 'Relay events dropped because the queue was full')
+    BUFFER_WAIT = Histogram('relay_buffer_wait_seconds', 'Time an event waited for its buffer to be known')
+    REMOVE_COLOR = Histogram('remove_color_seconds', 'Time spent stripping WeeChat colors from a line')
+
+    SLACK_API = Histogram('slack_api_seconds', 'Slack API call latency', ('workspace', 'method'))
+    SLACK_RATE_LIMITED = Counter('slack_rate_limited_total', 'Slack API calls rejected with HTTP 429',
+                                 ('workspace', 'method'))
+    SLACK_MESSAGES = Gauge('slack_outbound_messages', 'Outgoing Slack messages by outcome', ('workspace', 'outcome'))
+
+    QUEUE_DEPTH = Gauge('queue_depth', 'Pending items per queue', ('queue',))
+    THREADS = Gauge('threads', 'Live threads')
+
+    UPLOAD_BYTES = Counter('upload_bytes_total', 'Bytes uploaded to the file upload provider', ('provider',))
+    UPLOAD = Histogram('upload_seconds', 'File upload duration', ('provider',))
+    UPLOAD_CACHE = Gauge('upload_cache_lookups', 'Upload cache lookups by outcome', ('outcome',))
+
+    @staticmethod
+    def render():
+        lines = []
+
+        for metric in _METRICS:
+            lines.extend(metric.render())
+
+        return '\n'.join(lines) + '\n'
+
+
+Metrics.THREADS.set_function(threading.active_count)
+
+
+class MetricsServer:
+    host: str
+    port: int
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+
+    async def _handle(self, request: web.Request):
+        return web.Response(text=Metrics.render(), content_type='text/plain', charset='utf-8',
+                            headers={'X-Prometheus-Format': '0.0.4'})
+
+    async def run(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self._handle)
+
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+
+        try:
+            await web.TCPSite(runner, self.host, self.port).start()
+
+            logging.info(f'Serving metrics on http://{self.host}:{self.port}/metrics')
+
+            # Until the runtime shuts down
+            await asyncio.get_event_loop().create_future()
+        finally:
+            await runner.cleanup()
@@ -0,0 +1,78 @@
+import binascii
+import logging
+import os
+
+
+class UploadAborted(Exception):
+    pass
+
+
+class MultipartStream:
+    CHUNK_SIZE = 64 * 1024
+
+    # Log upload progress every this many bytes
+    PROGRESS_STEP = 8 * 1024 * 1024
+
+    field: str
+    filename: str
+    mime: str
+    size: int
+    content_type: str
+
+    def __init__(self, field: str, filename: str, mime: str, chunks, size: int):
+        self.field = field
+        self.filename = filename
+        self.mime = mime
+        self.size = size
+
+        self._chunks = chunks
+
+        boundary = binascii.hexlify(os.urandom(16)).decode()
+
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+
+        self._head = (f'--{boundary}\r\n'
+                      f'Content-Disposition: form-data; name="{self._quote(field)}"; '
+                      f'filename="{self._quote(filename)}"\r\n'
+                      f'Content-Type: {mime}\r\n'
+                      f'\r\n').encode()
+        self._tail = f'\r\n--{boundary}--\r\n'.encode()
+
+    @staticmethod
+    def _quote(value: str):
+        # Same escaping browsers (and urllib3) use for multipart parameters
+        return value.replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+
+    def __len__(self):
+        # Lets requests send a Content-Length instead of a chunked body
+        return len(self._head) + self.size + len(self._tail)
+
+    def __iter__(self):
+        sent = 0
+        reported = 0
+
+        try:
+            yield self._head
+
+            for chunk in self._chunks:
+                sent += len(chunk)
+
+                if sent > self.size:
+                    raise UploadAborted(f'{self.filename} is larger than {self.size} bytes')
+
+                if sent - reported >= MultipartStream.PROGRESS_STEP:
+                    reported = sent
+                    logging.info(f'Uploading {self.filename}: {sent * 100 // self.size}% ({sent}/{self.size} bytes)')
+
+                yield chunk
+
+            if sent != self.size:
+                raise UploadAborted(f'{self.filename} ended after {sent} of {self.size} bytes')
+
+            yield self._tail
+        finally:
+            # Release the download connection even if the upload was aborted
+            close = getattr(self._chunks, 'close', None)
+
+            if close is not None:
+                close()
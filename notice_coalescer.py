@@ -0,0 +1,144 @@
+import re
+import threading
+import time
+
+
+class NoticeCoalescer:
+    # Server messages that tend to come in floods, all other ones are passed through
+    VERBS = {
+        'irc_join': 'joined',
+        'irc_part': 'left',
+        'irc_quit': 'quit',
+        'irc_nick': 'changed nick',
+        'irc_mode': 'changed mode',
+    }
+
+    # Quit reason consisting of two server names, e.g. "(*.net *.split)"
+    NETSPLIT_RE = re.compile(r'\((?:[\w*-]+\.)+[\w*-]+ (?:[\w*-]+\.)+[\w*-]+\)$')
+
+    MAX_NICKS = 10
+
+    emit: callable
+    window: float
+    max_delay: float
+    max_batch: int
+
+    def __init__(self, emit: callable, window: float, max_delay: float, max_batch: int):
+        self.emit = emit
+        self.window = window
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+
+        self._cond = threading.Condition()
+        self._batches = {}
+        self._stopped = False
+        self._thread = None
+
+        # Serializes emitting, so that a flushed batch always goes out
+        # before a message that caused the flush
+        self._emit_lock = threading.Lock()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='notice-coalescer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+        if self._thread is not None:
+            self._thread.join()
+
+        self._flush(list(self._batches.keys()))
+
+    def add(self, channel: str, tags_array: list, msg: str):
+        verb = next((tag for tag in tags_array if tag in NoticeCoalescer.VERBS), None)
+
+        with self._emit_lock:
+            if verb is None or self.window <= 0:
+                self._flush([channel])
+                self.emit(channel, msg)
+                return
+
+            nick = next((tag[5:] for tag in tags_array if tag.startswith('nick_')), None)
+            now = time.monotonic()
+
+            with self._cond:
+                batch = self._batches.get(channel)
+
+                if batch is None:
+                    batch = self._batches[channel] = {'lines': [], 'first': now}
+
+                batch['lines'].append((verb, nick, msg))
+                batch['deadline'] = min(now + self.window, batch['first'] + self.max_delay)
+
+                is_full = len(batch['lines']) >= self.max_batch
+
+                self._cond.notify()
+
+            if is_full:
+                self._flush([channel])
+
+    def _flush(self, channels: list):
+        for channel in channels:
+            with self._cond:
+                batch = self._batches.pop(channel, None)
+
+            if batch is not None:
+                self.emit(channel, self.summarize(batch['lines']))
+
+    def summarize(self, lines: list):
+        if len(lines) == 1:
+            return lines[0][2]
+
+        groups = {}
+
+        for verb, nick, msg in lines:
+            group = groups.setdefault(verb, {'count': 0, 'nicks': [], 'netsplit': 0})
+            group['count'] += 1
+
+            if nick is not None and nick not in group['nicks']:
+                group['nicks'].append(nick)
+
+            if verb == 'irc_quit' and NoticeCoalescer.NETSPLIT_RE.search(msg):
+                group['netsplit'] += 1
+
+        parts = []
+
+        for verb, group in groups.items():
+            part = f'{group["count"]} {NoticeCoalescer.VERBS[verb]}'
+
+            if group['netsplit'] == group['count']:
+                part += ' (netsplit)'
+            elif group['netsplit'] > 0:
+                part += f' ({group["netsplit"]} netsplit)'
+
+            nicks = group['nicks']
+
+            if nicks:
+                part += ': ' + ', '.join(nicks[:NoticeCoalescer.MAX_NICKS])
+
+                if len(nicks) > NoticeCoalescer.MAX_NICKS:
+                    part += f' and {len(nicks) - NoticeCoalescer.MAX_NICKS} more'
+
+            parts.append(part)
+
+        return '; '.join(parts)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+
+                now = time.monotonic()
+                expired = [channel for channel, batch in self._batches.items() if batch['deadline'] <= now]
+
+                if not expired:
+                    deadlines = [batch['deadline'] for batch in self._batches.values()]
+                    self._cond.wait(min(deadlines) - now if deadlines else None)
+                    continue
+
+            with self._emit_lock:
+                self._flush(expired)
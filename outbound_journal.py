@@ -0,0 +1,127 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+
+class OutboundJournal:
+    path: str
+    flush_interval: float
+    flush_batch: int
+
+    # Compact the database file after this many deleted entries
+    COMPACT_EVERY = 10000
+
+    def __init__(self, path: str, flush_interval: float, flush_batch: int):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=FULL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS outbound ('
+                         'id INTEGER PRIMARY KEY, '
+                         'channel TEXT NOT NULL, '
+                         'priority INTEGER NOT NULL, '
+                         'args TEXT NOT NULL, '
+                         'created REAL NOT NULL)')
+
+        self._next_id = (self._db.execute('SELECT MAX(id) FROM outbound').fetchone()[0] or 0) + 1
+
+        self._cond = threading.Condition()
+        self._writes = {}
+        self._acks = []
+        self._deleted = 0
+
+        self._stopped = False
+        self._thread = None
+
+    def load(self):
+        # Everything that was not acknowledged before the last shutdown, in the original order
+        rows = self._db.execute('SELECT id, channel, priority, args, created FROM outbound ORDER BY id').fetchall()
+
+        return [(row[0], row[1], row[2], json.loads(row[3]), row[4]) for row in rows]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='outbound-journal', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+        if self._thread is not None:
+            self._thread.join()
+
+        self._flush()
+        self._db.close()
+
+    def append(self, channel: str, priority: int, args: tuple):
+        with self._cond:
+            entry_id = self._next_id
+            self._next_id += 1
+
+            self._writes[entry_id] = (entry_id, channel, int(priority), json.dumps(args), time.time())
+
+            if len(self._writes) >= self.flush_batch:
+                self._cond.notify()
+
+            return entry_id
+
+    def ack(self, entry_id: int):
+        with self._cond:
+            # Delivered before it even hit the disk
+            if self._writes.pop(entry_id, None) is not None:
+                return
+
+            self._acks.append((entry_id,))
+
+    def _flush(self):
+        with self._cond:
+            writes, self._writes = list(self._writes.values()), {}
+            acks, self._acks = self._acks, []
+
+        if not writes and not acks:
+            return
+
+        try:
+            # A single transaction, so a whole batch costs a single fsync
+            self._db.execute('BEGIN')
+            self._db.executemany('INSERT INTO outbound VALUES (?, ?, ?, ?, ?)', writes)
+            self._db.executemany('DELETE FROM outbound WHERE id = ?', acks)
+            self._db.execute('COMMIT')
+        except sqlite3.Error:
+            logging.exception('Failed to write outbound journal')
+
+            if self._db.in_transaction:
+                self._db.execute('ROLLBACK')
+
+            # Retried with the next flush, ahead of whatever came in meanwhile
+            with self._cond:
+                pending, self._writes = self._writes, {write[0]: write for write in writes}
+                self._writes.update(pending)
+                self._acks = acks + self._acks
+
+            return
+
+        self._deleted += len(acks)
+
+        if self._deleted >= OutboundJournal.COMPACT_EVERY:
+            self._deleted = 0
+            self._db.execute('PRAGMA incremental_vacuum')
+            self._db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._stopped or len(self._writes) >= self.flush_batch,
+                                    self.flush_interval)
+
+                if self._stopped:
+                    return
+
+            self._flush()
@@ -0,0 +1,385 @@
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from enum import IntEnum
+
+
+class Priority(IntEnum):
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+class RetryLater(Exception):
+    retry_after: float
+
+    def __init__(self, retry_after: float, reason: str = 'Temporary failure'):
+        super().__init__(f'{reason}, retry after {retry_after}s')
+
+        self.retry_after = retry_after
+
+
+class RateLimited(RetryLater):
+    def __init__(self, retry_after: float):
+        super().__init__(retry_after, 'Rate limited')
+
+
+class TokenBucket:
+    rate: float
+    burst: float
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float):
+        self._refill(now)
+
+        if now < self.paused_until:
+            return self.paused_until - now
+
+        if self.tokens >= 1:
+            return 0
+
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, until: float):
+        self.paused_until = max(self.paused_until, until)
+        self.tokens = 0
+
+
+class _Channel:
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        # Messages of a single channel are always sent in order, priority only
+        # decides which channel is served next
+        self.queue = deque()
+        self.depth = [0 for _ in Priority]
+        self.busy = False
+
+    def priority(self):
+        # The most important message queued for this channel
+        for priority, depth in enumerate(self.depth):
+            if depth:
+                return priority
+
+        return None
+
+    def push(self, item: tuple, front: bool = False):
+        if front:
+            self.queue.appendleft(item)
+        else:
+            self.queue.append(item)
+
+        self.depth[item[1]] += 1
+
+    def pop(self, item: tuple = None):
+        if item is None:
+            item = self.queue.popleft()
+        else:
+            self.queue.remove(item)
+
+        self.depth[item[1]] -= 1
+
+        return item
+
+
+class OutboundScheduler:
+    name: str
+    send: callable
+    rate: float
+    burst: float
+    workers: int
+    queue_limit: int
+
+    def __init__(self, name: str, send: callable, rate: float, burst: float, workers: int,
+                 queue_limit: int, journal=None):
+        self.name = name
+        self.send = send
+        self.rate = rate
+        self.burst = burst
+        self.workers = workers
+        self.queue_limit = queue_limit
+
+        # Optional OutboundJournal, keeps queued messages across outages and restarts
+        self.journal = journal
+
+        self._cond = threading.Condition()
+        self._channels = {}
+        self._pending_channels = set()
+        self._pending = 0
+        self._seq = itertools.count()
+
+        self._stopped = False
+        self._deadline = None
+        self._threads = []
+
+        self._sent = 0
+        self._failed = 0
+        self._dropped = 0
+        self._retried = 0
+        self._rate_limited = 0
+        self._wait_total = 0
+        self._wait_max = 0
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'{self.name}-{i}', daemon=True)
+            thread.start()
+
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5):
+        # Keeps sending what is already queued for up to `timeout` seconds
+        with self._cond:
+            self._stopped = True
+            self._deadline = time.monotonic() + timeout
+            self._cond.notify_all()
+
+        for thread in self._threads:
+            thread.join(max(0, self._deadline - time.monotonic()) + 1)
+
+        self._threads = []
+
+        with self._cond:
+            if not self._pending:
+                return
+
+            if self.journal is None:
+                logging.warning(f'{self.name}: dropped {self._pending} undelivered message(s)')
+            else:
+                logging.info(f'{self.name}: {self._pending} undelivered message(s) left in the journal')
+
+    def restore(self):
+        # Replays whatever the journal still holds, in the original order
+        if self.journal is None:
+            return
+
+        entries = self.journal.load()
+
+        if entries:
+            logging.info(f'{self.name}: replaying {len(entries)} undelivered message(s)')
+
+        with self._cond:
+            for entry_id, channel, priority, args, _ in entries:
+                self._enqueue(channel, Priority(priority), tuple(args), entry_id, None)
+
+    def _channel(self, channel: str):
+        # Called with the lock held
+        state = self._channels.get(channel)
+
+        if state is None:
+            state = self._channels[channel] = _Channel(TokenBucket(self.rate, self.burst))
+
+        return state
+
+    def _enqueue(self, channel: str, priority: Priority, args: tuple, entry_id: int, trace):
+        # Called with the lock held
+        self._channel(channel).push((next(self._seq), priority, time.monotonic(), args, entry_id, trace))
+
+        self._pending += 1
+        self._pending_channels.add(channel)
+        self._cond.notify()
+
+    def _evict_low_priority(self):
+        # Called with the lock held, drops the oldest queued low priority message
+        oldest = None
+
+        for channel in self._pending_channels:
+            state = self._channels[channel]
+
+            if not state.depth[Priority.LOW]:
+                continue
+
+            item = next(item for item in state.queue if item[1] == Priority.LOW)
+
+            if oldest is None or item[0] < oldest[2][0]:
+                oldest = (channel, state, item)
+
+        if oldest is None:
+            return False
+
+        channel, state, item = oldest
+        _, _, _, _, entry_id, trace = state.pop(item)
+
+        if trace is not None:
+            trace.finish(outcome='dropped')
+
+        self._forget(entry_id)
+        self._pending -= 1
+
+        if not state.queue:
+            self._pending_channels.discard(channel)
+
+        return True
+
+    def _forget(self, entry_id: int):
+        if self.journal is not None and entry_id is not None:
+            self.journal.ack(entry_id)
+
+    def submit(self, channel: str, priority: Priority, *args, trace=None):
+        with self._cond:
+            if self._pending >= self.queue_limit:
+                self._dropped += 1
+
+                # Shed join/part/quit noise first
+                if priority == Priority.LOW or not self._evict_low_priority():
+                    logging.warning(f'{self.name}: queue limit of {self.queue_limit} reached, '
+                                    f'dropping message to {channel}')
+                    return False
+
+            entry_id = self.journal.append(channel, priority, args) if self.journal is not None else None
+
+            self._enqueue(channel, priority, args, entry_id, trace)
+
+        return True
+
+    def stats(self):
+        with self._cond:
+            depth = [0 for _ in Priority]
+
+            for channel in self._pending_channels:
+                for priority, count in enumerate(self._channels[channel].depth):
+                    depth[priority] += count
+
+            return {
+                'queue_depth': sum(depth),
+                'queue_depth_by_priority': {priority.name.lower(): depth[priority] for priority in Priority},
+                'sent': self._sent,
+                'failed': self._failed,
+                'dropped': self._dropped,
+                'retried': self._retried,
+                'rate_limited': self._rate_limited,
+                'wait_avg': self._wait_total / self._sent if self._sent else 0,
+                'wait_max': self._wait_max,
+            }
+
+    def _next(self):
+        # Picks the channel with the most important, oldest message among those that have a token
+        # available, and sends whatever is at the head of its queue
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                best, best_key, timeout = None, None, None
+
+                if self._stopped and (not self._pending or now >= self._deadline):
+                    return None, None
+
+                for channel in self._pending_channels:
+                    state = self._channels[channel]
+
+                    if state.busy:
+                        continue
+
+                    delay = state.bucket.delay(now)
+
+                    if delay > 0:
+                        timeout = delay if timeout is None else min(timeout, delay)
+                        continue
+
+                    key = (state.priority(), state.queue[0][0])
+
+                    if best_key is None or key < best_key:
+                        best, best_key = channel, key
+
+                if best is not None:
+                    state = self._channels[best]
+                    state.bucket.take(now)
+                    state.busy = True
+
+                    item = state.pop()
+                    self._pending -= 1
+
+                    # Other channels may be ready as well, let the next worker look
+                    self._cond.notify()
+
+                    return best, item
+
+                if self._stopped:
+                    timeout = min(timeout, self._deadline - now) if timeout is not None else self._deadline - now
+
+                self._cond.wait(timeout)
+
+    def _done(self, channel: str, item: tuple, retry_after: float = None):
+        with self._cond:
+            state = self._channels[channel]
+            state.busy = False
+
+            if retry_after is not None:
+                state.push(item, front=True)
+                state.bucket.pause(time.monotonic() + retry_after)
+
+                self._pending += 1
+            else:
+                self._forget(item[4])
+
+            if not state.queue:
+                self._pending_channels.discard(channel)
+
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            channel, item = self._next()
+
+            if channel is None:
+                return
+
+            _, _, enqueued, args, _, trace = item
+
+            if trace is not None:
+                trace.end('outbound_queue')
+                trace.begin('send')
+
+            try:
+                self.send(*args)
+            except RetryLater as e:
+                logging.warning(f'{self.name}: {e} ({channel})')
+
+                if trace is not None:
+                    trace.end('send')
+                    trace.begin('outbound_queue')
+
+                with self._cond:
+                    if isinstance(e, RateLimited):
+                        self._rate_limited += 1
+                    else:
+                        self._retried += 1
+
+                self._done(channel, item, e.retry_after)
+                continue
+            except Exception:
+                logging.exception(f'{self.name}: failed to send message to {channel}')
+
+                if trace is not None:
+                    trace.finish(outcome='failed')
+
+                with self._cond:
+                    self._failed += 1
+            else:
+                wait = time.monotonic() - enqueued
+
+                if trace is not None:
+                    trace.end('send')
+                    trace.finish(outcome='sent')
+
+                with self._cond:
+                    self._sent += 1
+                    self._wait_total += wait
+                    self._wait_max = max(self._wait_max, wait)
+
+            self._done(channel, item)
@@ -1,32 +1,89 @@
+import asyncio
 import logging
-import socket
 import threading
 import time
-from threading import current_thread
 
+from buffer_registry import BufferRegistry
 from config import Config
+from metrics import Metrics
 from pyweechat.pyweechat import WeeChatClient, WeeChatBuffer, WeeChatMessage
-from utils import Utils
+from relay_reader import RelayReader
+from tracing import Tracer
 
 
 class RelayClient(WeeChatClient):
+    # Buffer fields requested at startup, the rest is never used
+    BUFFER_FIELDS = 'number,full_name,short_name,name'
+
+    # Id of the buffer list request sent after a warm start
+    RECONCILE_BUFFERS_ID = 'reconcile_buffers'
+
+    # Buffers of additional relays are known as '<relay name>:<full name>'
+    NAMESPACE_SEPARATOR = ':'
+
+    name: str
+    hostname: str
+    port: int
+    password: str
+    use_ssl: bool
+
     on_buffer_line_added_callback: callable
     on_buffer_opened_callback: callable
     on_buffer_closing_callback: callable
     on_post_setup_buffers_callback: callable
 
-    def __init__(self):
-        pass
+    reader: RelayReader
+    registry: BufferRegistry
+
+    def __init__(self, name: str, hostname: str, port: int, password: str, use_ssl: bool):
+        # The main relay has no name, its buffers keep their WeeChat names
+        self.name = name
+        self.hostname = hostname
+        self.port = port
+        self.password = password
+        self.use_ssl = use_ssl
+
+        self.registry = BufferRegistry()
+        self._send_lock = threading.Lock()
+        self._pending = []
+        self._state = None
+
+    def init(self, state: dict = None):
+        # Buffers known from a state snapshot, verified against WeeChat once connected
+        self._state = state
+
+        super().__init__(hostname=self.hostname,
+                         password=self.password,
+                         port=self.port,
+                         use_ssl=self.use_ssl)
 
-    def init(self):
-        super().__init__(hostname=Config.Relay.Hostname,
-                         password=Config.Relay.Password,
-                         port=Config.Relay.Port,
-                         use_ssl=Config.Relay.UseSSL)
+    @staticmethod
+    def configured():
+        relays = [RelayClient('', Config.Relay.Hostname, Config.Relay.Port, Config.Relay.Password,
+                              Config.Relay.UseSSL)]
+
+        for name, settings in Config.Relay.Extra.items():
+            relays.append(RelayClient(name, settings.get('Hostname', ''), settings.get('Port', 0),
+                                      settings.get('Password', ''), settings.get('UseSSL', False)))
+
+        return relays
+
+    def namespaced(self, full_name: str):
+        return f'{self.name}{RelayClient.NAMESPACE_SEPARATOR}{full_name}' if self.name else full_name
+
+    def local(self, full_name: str):
+        # Name of a (namespaced) buffer as known by WeeChat
+        return full_name[len(self.name) + len(RelayClient.NAMESPACE_SEPARATOR):] if self.name else full_name
 
     def _setup(self):
+        self.reader = RelayReader(self.socket.socket)
+
         self._check_auth()
-        self._setup_buffers()
+
+        if self._state is not None:
+            self._restore_buffers(self._state.get('buffers', []))
+        else:
+            self._setup_buffers()
 
         # Setup event handling only after reading buffers completed
         self.socket.on('buffer_line_added', self._on_buffer_line_added)
@@ -36,68 +93,170 @@ class RelayClient(WeeChatClient):
         # Turn synchronization on for all channels
         self.sync('*')
 
+    def _send(self, data: str):
+        with self._send_lock:
+            self.socket.socket.sendall(data.encode() + b'\r\n')
+
+    def _read(self, timeout: float = None):
+        if self._pending:
+            messages, self._pending = self._pending, []
+            return messages
+
+        return [WeeChatMessage(frame) for frame in self.reader.read(timeout)]
+
+    def _request(self, data: str, timeout: float = 5):
+        self._send(data)
+
+        deadline = time.monotonic() + timeout
+
+        while time.monotonic() < deadline:
+            messages = self._read(deadline - time.monotonic())
+
+            if messages:
+                self._pending = messages[1:]
+                return messages[0]
+
+        raise TimeoutError(f'Timed out while waiting for WeeChat Relay to respond to {data.split()[0]}')
+
+    def _dispatch(self, message: WeeChatMessage):
+        if message.id == RelayClient.RECONCILE_BUFFERS_ID:
+            self._reconcile_buffers(self._hdata_list(message))
+            return
+
+        event = message.id[1:] if message.id.startswith('_') else message.id
+        Metrics.RELAY_EVENTS.labels(event).inc()
+
+        callback = self.socket.events.get(event)
+
+        if callback is not None:
+            callback(message.get_hdata_result())
+
     def _check_auth(self):
-        self.socket.send_async('ping')
+        try:
+            response = self._request('ping')
+        except (ConnectionError, TimeoutError):
+            raise Exception('Failed to receive pong back from WeeChat Relay (probably wrong credentials in '
+                            'config.py)')
 
-        start = time.time()
-        timeout = 5
+        if response.id != '_pong':
+            raise Exception('Failed to receive pong back from WeeChat Relay (probably wrong credentials in '
+                            'config.py)')
 
-        while time.time() < start + timeout:
-            try:
-                response = self.socket.socket.recv(4096 * 1024)
-
-                if response is not None and WeeChatMessage(response).id == '_pong':
-                    logging.info('Successfully logged in to WeeChat Relay server!')
-                    return
-            except ConnectionResetError:
-                raise Exception('Failed to receive pong back from WeeChat Relay (probably wrong credentials in '
-                                'config.py)')
-            except socket.error:
-                pass
+        logging.info('Successfully logged in to WeeChat Relay server!')
 
-            time.sleep(0.15)
+    @staticmethod
+    def _hdata_list(message: WeeChatMessage):
+        result = message.get_hdata_result()
 
-        raise Exception('Failed to receive pong back from WeeChat Relay (probably wrong credentials in config.py)')
+        # A single item is not wrapped into a list
+        if result is None:
+            return []
 
-    def _setup_buffers(self):
-        pointer = 'gui_buffers'
+        if isinstance(result, dict):
+            return [result]
 
-        while True:
-            # Read meta information
-            resp_buf = self.socket.send(f'hdata buffer:{pointer}').get_hdata_result()
+        return result
 
-            if resp_buf is None:
-                break
+    def _buffer(self, resp_buf: dict):
+        buffer = WeeChatBuffer(resp_buf)
+        buffer.pointer = f'0x{resp_buf["__path"][0]}'
+        buffer.full_name = self.namespaced(buffer.full_name)
 
-            buffer = WeeChatBuffer(resp_buf)
-            buffer.pointer = pointer
+        return buffer
+
+    def _namespace_response(self, response: dict):
+        # Handlers serve all relays, tell them where an event came from. A copy, the
+        # response may still be needed with its WeeChat names
+        response = dict(response, __relay=self.name)
+
+        if 'full_name' in response:
+            response['full_name'] = self.namespaced(response['full_name'])
+
+        return response
 
-            self.buffers.append(buffer)
+    def _setup_buffers(self):
+        # All buffers in a single round trip instead of walking the list one request at a time
+        result = self._hdata_list(self._request(f'hdata buffer:gui_buffers(*) {RelayClient.BUFFER_FIELDS}'))
+
+        self.buffers = [self._buffer(resp_buf) for resp_buf in result]
 
-            next_buffer = resp_buf.get('next_buffer', '0')
+        logging.info(f'Found {len(result)} WeeChat buffers')
 
-            if next_buffer == '0':
-                break
+        self.on_post_setup_buffers_callback()
 
-            pointer = f'0x{next_buffer}'
+    def _restore_buffers(self, buffers: list):
+        self.buffers = [self._buffer(resp_buf) for resp_buf in buffers]
 
         self.on_post_setup_buffers_callback()
 
+        # Don't wait for the reply, it's handled like any other event once we're running
+        self._send(f'({RelayClient.RECONCILE_BUFFERS_ID}) hdata buffer:gui_buffers(*) {RelayClient.BUFFER_FIELDS}')
+
+    def _reconcile_buffers(self, result: list):
+        known = {self.local(buffer.full_name): buffer for buffer in self.buffers}
+        live = {resp_buf.get('full_name') for resp_buf in result}
+
+        # Buffers opened or closed while we were gone are replayed as events
+        for full_name, buffer in known.items():
+            if full_name not in live:
+                self._on_buffer_closing({'__path': [BufferRegistry.normalize_pointer(buffer.pointer)],
+                                         'full_name': full_name})
+
+        for resp_buf in result:
+            if resp_buf.get('full_name') not in known:
+                self._on_buffer_opened(resp_buf)
+
+        # Pointers are only valid as long as WeeChat keeps running
+        self.buffers = [self._buffer(resp_buf) for resp_buf in result]
+
+        logging.info(f'Reconciled {len(result)} WeeChat buffers with the state snapshot')
+
+    def snapshot(self):
+        return {
+            'buffers': [{
+                '__path': [BufferRegistry.normalize_pointer(buffer.pointer)],
+                'number': buffer.number,
+                'full_name': self.local(buffer.full_name),
+                'short_name': buffer.short_name,
+                'name': buffer.name,
+            } for buffer in self.buffers],
+        }
+
     def _on_buffer_line_added(self, response: dict):
         if self.on_buffer_line_added_callback is not None:
-            self.on_buffer_line_added_callback(response)
+            # Follows the line all the way to Slack
+            trace = response['__trace'] = Tracer.shared().start('relay_line', relay=self.name,
+                                                                buffer=response.get('buffer'))
+            trace.begin('relay_queue')
+
+            self.on_buffer_line_added_callback(self._namespace_response(response))
 
     def _on_buffer_opened(self, response: dict):
-        if self.on_buffer_opened_callback is not None:
-            self.on_buffer_opened_callback(response)
+        # Wakes up everyone waiting for lines of this buffer
+        self.registry.add(self._buffer(response))
 
-        super()._on_buffer_opened(response)
+        if self.on_buffer_opened_callback is not None:
+            self.on_buffer_opened_callback(self._namespace_response(response))
 
     def _on_buffer_closing(self, response: dict):
+        self.registry.remove(pointer=response['__path'][0])
+
         if self.on_buffer_closing_callback is not None:
-            self.on_buffer_closing_callback(response)
+            self.on_buffer_closing_callback(self._namespace_response(response))
+
+    @property
+    def buffers(self):
+        return self.registry.buffers()
 
-        super()._on_buffer_closing(response)
+    @buffers.setter
+    def buffers(self, buffers: list):
+        self.registry.replace(buffers)
+
+    def get_buffer_by_pointer(self, pointer: str):
+        return self.registry.get_by_pointer(pointer)
+
+    def get_buffer_by_full_name(self, full_name: str):
+        return self.registry.get_by_full_name(full_name)
 
     def set_on_buffer_line_added_callback(self, f: callable):
         self.on_buffer_line_added_callback = f
@@ -111,35 +270,49 @@ class RelayClient(WeeChatClient):
     def set_on_post_setup_buffers_callback(self, f: callable):
         self.on_post_setup_buffers_callback = f
 
-    def get_direct_message_buffers(self):
-        ret = []
+    def input(self, buffer: str, message: str):
+        # WeeChat does not reply to input, don't wait for a response
+        self._send(f'input {self.local(buffer)} {message}')
+
+    def sync(self, channel: str):
+        self._send(f'sync {channel}')
 
-        for channel in self.buffers:
-            channel_name = Utils.get_slack_direct_message_channel_for_buffer(channel.full_name)
+    def wait_for_buffer_by_pointer(self, pointer: str, timeout: int = 5):
+        return self.registry.wait_for_pointer(pointer, timeout)
 
-            if channel_name is not None:
-                ret.append((channel.full_name, channel_name))
+    def _on_readable(self, closed: asyncio.Future):
+        try:
+            frames = self.reader.read_available()
+        except ConnectionError as e:
+            if not closed.done():
+                closed.set_exception(e)
 
-        return ret
+            return
 
-    def wait_for_buffer_by_pointer(self, pointer: str, timeout: int = 5):
-        buffer = None
-        start = time.time()
+        for frame in frames:
+            self._dispatch(WeeChatMessage(frame))
 
-        while time.time() < start + timeout and buffer is None:
-            buffer = self.get_buffer_by_pointer(pointer)
-            time.sleep(0.15)
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        closed = loop.create_future()
 
-        return buffer
+        # Whatever arrived together with the last setup response
+        messages, self._pending = self._pending, []
+
+        for message in messages:
+            self._dispatch(message)
 
-    def _run(self):
-        while current_thread().is_alive:
-            self.socket.poll()
-            time.sleep(0.15)
+        # Woken up by the event loop as soon as the socket has data
+        loop.add_reader(self.reader.sock, self._on_readable, closed)
 
-        self.socket.disconnect()
+        try:
+            await closed
+        finally:
+            loop.remove_reader(self.reader.sock)
 
-    def tasks(self):
-        return [
-            threading.Thread(target=self._run),
-        ]
+            self.reader.close()
+
+            try:
+                self.socket.disconnect()
+            except OSError:
+                pass
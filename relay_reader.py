@@ -0,0 +1,69 @@
+import selectors
+import socket
+import ssl
+import struct
+
+
+class RelayReader:
+    RECV_SIZE = 256 * 1024
+
+    sock: socket.socket
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+
+        self._buffer = bytearray()
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.sock, selectors.EVENT_READ)
+
+    def feed(self, data: bytes):
+        self._buffer += data
+
+        frames = []
+
+        # Every relay message starts with its total length (including the length itself)
+        while len(self._buffer) >= 4:
+            length = struct.unpack('>I', self._buffer[:4])[0]
+
+            if len(self._buffer) < length:
+                break
+
+            frames.append(bytes(self._buffer[:length]))
+            del self._buffer[:length]
+
+        return frames
+
+    def read(self, timeout: float = None):
+        # Blocking read, used while setting up the connection
+        if not self._selector.select(timeout):
+            return []
+
+        return self.read_available()
+
+    def read_available(self):
+        return self.feed(self._recv_all())
+
+    def _recv_all(self):
+        chunks = []
+
+        # Grab everything that is available right now, TLS may hold more
+        # decrypted data than the selector knows about
+        while True:
+            try:
+                chunk = self.sock.recv(RelayReader.RECV_SIZE)
+            except (BlockingIOError, ssl.SSLWantReadError):
+                break
+
+            if not chunk:
+                if chunks:
+                    break
+
+                raise ConnectionResetError('WeeChat Relay closed the connection')
+
+            chunks.append(chunk)
+
+        return b''.join(chunks)
+
+    def close(self):
+        self._selector.close()
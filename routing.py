@@ -0,0 +1,103 @@
+import threading
+from functools import lru_cache
+
+from config import Config
+from utils import Utils
+
+
+class RoutingTable:
+    MEMO_SIZE = 8192
+
+    forward: dict
+    reverse: dict
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, channels: dict, privmsgs: dict):
+        # WeeChat buffer -> Slack channel, and the other way around
+        self.forward = dict(channels)
+        self.reverse = {}
+
+        for weechat_channel, slack_channel in channels.items():
+            self.reverse.setdefault(slack_channel, weechat_channel)
+
+        # PrivMsgs prefixes stored char by char, a node's None key holds the
+        # (position in config, weechat prefix, slack prefix) of a prefix ending there
+        self._trie = {}
+
+        for i, (weechat_prefix, slack_prefix) in enumerate(privmsgs.items()):
+            node = self._trie
+
+            for char in weechat_prefix:
+                node = node.setdefault(char, {})
+
+            node[None] = (i, weechat_prefix, slack_prefix)
+
+        self._lock = threading.Lock()
+        self._dm_reverse = {}
+
+        self.dm_channel_for_buffer = lru_cache(maxsize=RoutingTable.MEMO_SIZE)(self._dm_channel_for_buffer)
+
+    @staticmethod
+    def default():
+        with RoutingTable._default_lock:
+            if RoutingTable._default is None:
+                RoutingTable._default = RoutingTable(Config.Global.Channels, Config.Global.PrivMsgs)
+
+            return RoutingTable._default
+
+    def _dm_channel_for_buffer(self, full_name: str):
+        matches = []
+        node = self._trie
+
+        for char in full_name:
+            if None in node:
+                matches.append(node[None])
+
+            node = node.get(char)
+
+            if node is None:
+                break
+        else:
+            if None in node:
+                matches.append(node[None])
+
+        # Same outcome as trying PrivMsgs prefixes in the order they were configured
+        for _, weechat_prefix, slack_prefix in sorted(matches):
+            name = Utils.sanitize_slack_channel_name(full_name, len(weechat_prefix))
+
+            # According to RFC 1459 channels are supposed to start with '&' or '#'
+            if not name.startswith(('&', '#')):
+                return slack_prefix + name
+
+        return None
+
+    def slack_channel_for_buffer(self, full_name: str):
+        slack_channel = self.forward.get(full_name)
+
+        if slack_channel is None:
+            slack_channel = self.dm_channel_for_buffer(full_name)
+
+        return slack_channel
+
+    def buffer_for_slack_channel(self, slack_channel: str):
+        with self._lock:
+            weechat_channel = self._dm_reverse.get(slack_channel)
+
+        if weechat_channel is None:
+            weechat_channel = self.reverse.get(slack_channel)
+
+        return weechat_channel
+
+    def add_dm(self, slack_channel: str, weechat_channel: str):
+        with self._lock:
+            self._dm_reverse[slack_channel] = weechat_channel
+
+    def remove_dm(self, slack_channel: str):
+        with self._lock:
+            self._dm_reverse.pop(slack_channel, None)
+
+    def dm_channels(self):
+        with self._lock:
+            return dict(self._dm_reverse)
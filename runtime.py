@@ -0,0 +1,70 @@
+import asyncio
+import logging
+import signal
+
+
+class Runtime:
+    loop: asyncio.AbstractEventLoop
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+        self._tasks = []
+        self._stopping = self.loop.create_future()
+
+        self._signal_handlers = {
+            signal.SIGINT: self._stop,
+            signal.SIGTERM: self._stop,
+        }
+
+    def on_signal(self, sig: int, callback: callable):
+        # Runs callback on the event loop whenever sig is received
+        self._signal_handlers[sig] = callback
+
+    def spawn(self, coroutine):
+        task = self.loop.create_task(coroutine)
+        task.add_done_callback(self._on_task_done)
+
+        self._tasks.append(task)
+
+        return task
+
+    def _on_task_done(self, task: asyncio.Task):
+        if task.cancelled():
+            return
+
+        # Losing either side of the bridge is fatal, shut everything down
+        if task.exception() is not None:
+            logging.error('Task failed, shutting down', exc_info=task.exception())
+
+        self._stop()
+
+    def _stop(self):
+        if not self._stopping.done():
+            self._stopping.set_result(None)
+
+    def stop(self):
+        # Safe to call from any thread
+        self.loop.call_soon_threadsafe(self._stop)
+
+    async def _main(self):
+        await self._stopping
+
+        for task in self._tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def run(self):
+        for sig, callback in self._signal_handlers.items():
+            self.loop.add_signal_handler(sig, callback)
+
+        try:
+            self.loop.run_until_complete(self._main())
+        finally:
+            for sig in self._signal_handlers:
+                self.loop.remove_signal_handler(sig)
+
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
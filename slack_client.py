@@ -1,44 +1,163 @@
 import asyncio
+import collections
 import html
 import json
 import logging
+import os
 import threading
-import time
-from threading import current_thread
 
 import requests
 import slack
 
+from channel_directory import ChannelDirectory
 from config import Config
+from dispatcher import Dispatcher
+from dm_reconciler import DmChannelReconciler
 from file_upload import FileUpload
+from http_transport import HttpTransport
+from metrics import Metrics
+from multipart_stream import MultipartStream
+from outbound_journal import OutboundJournal
+from outbound_scheduler import OutboundScheduler, Priority, RateLimited, RetryLater
+from tracing import NULL_TRACE, Trace, Tracer
 
 
 class SlackClient:
+    # Seconds to wait before retrying a message when Slack is down
+    OUTAGE_RETRY_DELAY = 5
+
+    # The main workspace has no name
+    name: str
+    token: str
+    api_url: str
+
+    # WeeChat buffer -> Slack channel, DMs aside
+    channel_map: dict
+
     rtm_client: slack.RTMClient
 
-    last_dm_channels: list
+    http: HttpTransport
+
+    channels: ChannelDirectory
+
+    journal: OutboundJournal
+
+    scheduler: OutboundScheduler
+
+    dm_channels: DmChannelReconciler
+
+    inbound: Dispatcher
+
+    uploads: Dispatcher
 
     message_callback: callable
 
-    def __init__(self):
+    def __init__(self, loop: asyncio.AbstractEventLoop, name: str, token: str, api_url: str, channel_map: dict,
+                 state: dict = None):
+        self.name = name
+        self.token = token
+        self.api_url = api_url
+        self.channel_map = channel_map
+
+        # Every workspace gets a connection pool of its own, the main one shares it with file uploads
+        if name:
+            self.http = HttpTransport(Config.Http.PoolSize, Config.Http.Timeout, Config.Http.Retries)
+        else:
+            self.http = HttpTransport.shared()
+
         self._check_auth()
-        self._sync_channels()
 
-        self.rtm_client = slack.RTMClient(token=Config.Slack.Token)
+        self.channels = ChannelDirectory(self._list_channels)
+
+        # Warm start, trust the state snapshot and verify it in the background
+        if state is not None:
+            self.channels.seed(state.get('channels', []))
+        else:
+            self.channels.refresh()
+            self._sync_channels()
+
+        self.journal = None
+
+        if Config.Journal.Path:
+            self.journal = OutboundJournal(self._path(Config.Journal.Path), Config.Journal.FlushInterval,
+                                           Config.Journal.FlushBatch)
+            self.journal.start()
+
+        self.scheduler = OutboundScheduler(self._label('slack-outbound'), self._post_message,
+                                           Config.Slack.RateLimit, Config.Slack.RateBurst, Config.Slack.SenderThreads,
+                                           Config.Slack.QueueLimit, self.journal)
+        self.scheduler.restore()
+        self.scheduler.start()
+
+        self.dm_channels = DmChannelReconciler(self._ensure_channel, self._archive_channel_by_name,
+                                               Config.Slack.DmDebounce)
+        self.dm_channels.start()
+
+        if state is not None:
+            self.dm_channels.seed(state.get('dm_channels', []))
+
+            threading.Thread(target=self._reconcile, name='slack-reconcile', daemon=True).start()
+
+        self.inbound = Dispatcher(self._label('slack-inbound'), Config.Slack.InboundWorkers,
+                                  Config.Slack.InboundQueueLimit)
+        self.inbound.start()
+
+        self.uploads = Dispatcher(self._label('slack-uploads'), Config.FileUpload.Workers, Config.FileUpload.QueueLimit)
+        self.uploads.start()
+
+        Metrics.QUEUE_DEPTH.labels(self._label('slack_inbound')).set_function(self.inbound.pending)
+        Metrics.QUEUE_DEPTH.labels(self._label('slack_uploads')).set_function(self.uploads.pending)
+        Metrics.QUEUE_DEPTH.labels(self._label('slack_outbound')).set_function(
+            lambda: self.scheduler.stats().get('queue_depth'))
+
+        for outcome in ('sent', 'failed', 'dropped', 'retried', 'rate_limited'):
+            Metrics.SLACK_MESSAGES.labels(self.name, outcome).set_function(
+                lambda outcome=outcome: self.scheduler.stats().get(outcome))
+
+        # RTMClient keeps its callbacks in a class attribute, every workspace needs a class of its own
+        rtm_class = type('RTMClient', (slack.RTMClient,), {'_callbacks': collections.defaultdict(list)})
+
+        self.rtm_client = rtm_class(token=self.token, base_url=self.api_url, loop=loop)
         self.rtm_client.on(event='message', callback=self._on_message)
+        self.rtm_client.on(event='channel_created', callback=self._on_channel_created)
+        self.rtm_client.on(event='channel_rename', callback=self._on_channel_rename)
+        self.rtm_client.on(event='channel_archive', callback=self._on_channel_archive)
+        self.rtm_client.on(event='channel_unarchive', callback=self._on_channel_unarchive)
+        self.rtm_client.on(event='channel_deleted', callback=self._on_channel_deleted)
+
+    def _label(self, label: str):
+        return f'{label}-{self.name}' if self.name else label
+
+    def _path(self, path: str):
+        if not self.name:
+            return path
+
+        root, ext = os.path.splitext(path)
+
+        return f'{root}.{self.name}{ext}'
 
-        self.last_dm_channels = []
+    def _api_request(self, http_method: str, method: str, **kwargs):
+        with Metrics.SLACK_API.labels(self.name, method).time():
+            response = self.http.request(http_method, f'{self.api_url}{method}', data=kwargs,
+                                         headers={'Authorization': f'Bearer {self.token}'})
+
+        if response.status_code == 429:
+            Metrics.SLACK_RATE_LIMITED.labels(self.name, method).inc()
+
+        return response
 
     def _api_get(self, method: str, **kwargs):
-        return json.loads(requests.get(f'https://slack.com/api/{method}', data=kwargs,
-                                       headers={'Authorization': f'Bearer {Config.Slack.Token}'}).content)
+        return json.loads(self._api_request('GET', method, **kwargs).content)
 
     def _api_post(self, method: str, **kwargs):
-        return json.loads(requests.post(f'https://slack.com/api/{method}', data=kwargs,
-                                        headers={'Authorization': f'Bearer {Config.Slack.Token}'}).content)
+        return json.loads(self._api_request('POST', method, **kwargs).content)
+
+    def _raw_stream(self, url: str):
+        # Lazy, nothing is requested until the first chunk is needed
+        with self.http.get(url, headers={'Authorization': f'Bearer {self.token}'}, stream=True) as response:
+            response.raise_for_status()
 
-    def _raw_get(self, url: str):
-        return requests.get(url, headers={'Authorization': f'Bearer {Config.Slack.Token}'}).content
+            yield from response.iter_content(MultipartStream.CHUNK_SIZE)
 
     def _check_auth(self):
         response = self._api_get('auth.test')
@@ -46,144 +165,259 @@ class SlackClient:
         if not response.get('ok'):
             raise Exception('Invalid Slack token!')
 
-    def _sync_channels(self):
+    def _list_channels(self):
+        channels = []
+        cursor = None
+
+        while True:
+            if cursor:
+                response = self._api_get('channels.list', exclude_members=True, limit=1000, cursor=cursor)
+            else:
+                response = self._api_get('channels.list', exclude_members=True, limit=1000)
+
+            channels += response.get('channels', [])
+            cursor = response.get('response_metadata', {}).get('next_cursor')
+
+            if not cursor:
+                return channels
+
+    def _archive_channel(self, channel_id: str):
+        if self._api_post('channels.archive', channel=channel_id).get('ok'):
+            self.channels.update(channel_id, is_archived=True)
+
+    def _unarchive_channel(self, channel_id: str):
+        if self._api_post('channels.unarchive', channel=channel_id).get('ok'):
+            self.channels.update(channel_id, is_archived=False)
+
+    def _create_channel(self, name: str):
+        response = self._api_post('channels.create', name=name)
+
+        if response.get('ok'):
+            self.channels.put(response.get('channel'))
+
+    def _reconcile(self):
+        try:
+            self.channels.refresh()
+
+            # Unlike on a cold start, DM channels are not recreated right after being archived
+            self._sync_channels(set(self.dm_channels.applied()) | set(self.dm_channels.channels()))
+        except Exception:
+            logging.exception('Failed to reconcile Slack channels with the state snapshot')
+            return
+
+        gone = []
+
+        for name in self.dm_channels.applied():
+            slack_channel = self.channels.get_by_name(name, refetch=False)
+
+            if slack_channel is None or slack_channel.get('is_archived'):
+                gone.append(name)
+
+        # Recreated/unarchived by the next apply
+        if gone:
+            self.dm_channels.forget(gone)
+
+        logging.info('Reconciled Slack channels with the state snapshot')
+
+    def snapshot(self):
+        return {
+            'channels': [{
+                'id': channel.get('id'),
+                'name': channel.get('name'),
+                'is_archived': channel.get('is_archived', False),
+                'is_general': channel.get('is_general', False),
+            } for channel in self.channels.channels()],
+            'dm_channels': self.dm_channels.applied(),
+        }
+
+    def _sync_channels(self, keep: set = frozenset()):
         # Clean-up no longer needed non-dm channels
-        self._clean_up_channels()
+        self._clean_up_channels(keep)
 
         # Create channels, if needed
-        self.create_channels([channel for _, channel in Config.Global.Channels.items()])
+        self.create_channels(list(self.channel_map.values()))
 
-    def _clean_up_channels(self):
-        weechat_channels = [channel for _, channel in Config.Global.Channels.items()]
-        slack_channels = self._api_get('channels.list').get('channels', [])
+    def _clean_up_channels(self, keep: set):
+        weechat_channels = list(self.channel_map.values())
 
         # Archive all no longer necessary channels
-        for channel in slack_channels:
-            if channel.get('name') not in weechat_channels:
+        for channel in self.channels.channels():
+            if channel.get('name') not in weechat_channels and channel.get('name') not in keep:
                 if channel.get('is_general') or channel.get('is_archived'):
                     continue
 
-                self._api_post('channels.archive', channel=channel.get('id'))
+                self._archive_channel(channel.get('id'))
 
-    def _clean_up_dm_channels(self, channels: list, s2w_dm_channels_map: dict):
-        slack_channels = self._api_get('channels.list').get('channels', [])
+    def create_channels(self, channels: list):
+        for channel in channels:
+            self._ensure_channel(channel)
 
-        # Archive all no longer necessary channels
-        for channel in slack_channels:
-            if channel.get('name') not in channels:
-                if channel.get('is_general') or channel.get('is_archived'):
-                    continue
+    def _ensure_channel(self, name: str):
+        slack_channel = self.channels.get_by_name(name, refetch=False)
 
-                if channel.get('name') not in s2w_dm_channels_map:
-                    continue
+        if slack_channel is None:
+            self._create_channel(name)
+        elif slack_channel.get('is_archived'):
+            self._unarchive_channel(slack_channel.get('id'))
 
-                self._api_post('channels.archive', channel=channel.get('id'))
+        slack_channel = self.channels.get_by_name(name, refetch=False)
 
-    def create_channels(self, channels: list):
-        slack_channels = self._api_get('channels.list').get('channels', [])
+        if slack_channel is None or slack_channel.get('is_archived'):
+            logging.error(f'Failed to create channel: {name}')
+            return False
 
-        for channel in channels:
-            for slack_channel in slack_channels:
-                if slack_channel.get('name').lower() == channel.lower():
-                    if slack_channel.get('is_archived'):
-                        self._api_post('channels.unarchive', channel=slack_channel.get('id'))
+        return True
 
-                    break
-            else:
-                self._api_post('channels.create', name=channel)
+    def _archive_channel_by_name(self, name: str):
+        slack_channel = self.channels.get_by_name(name, refetch=False)
+
+        if slack_channel is not None and not slack_channel.get('is_archived'):
+            self._archive_channel(slack_channel.get('id'))
 
-    def create_dm_channels(self, channels: list, s2w_dm_channels_map: dict):
-        self.create_channels(channels)
-        self._clean_up_dm_channels(channels, s2w_dm_channels_map)
+    def _post_message(self, channel: str, username: str, msg: str):
+        try:
+            response = self._api_request('POST', 'chat.postMessage', channel=channel, username=username, text=msg)
+        except requests.RequestException as e:
+            # Slack is unreachable, keep the message queued until it comes back
+            raise RetryLater(SlackClient.OUTAGE_RETRY_DELAY, f'Failed to reach Slack ({e})')
 
-        self.last_dm_channels = channels
+        if response.status_code == 429:
+            raise RateLimited(float(response.headers.get('Retry-After', 1)))
 
-    def wait_for_dm_channel(self, channel: str, timeout: int = 5):
-        start = time.time()
+        if response.status_code >= 500:
+            raise RetryLater(SlackClient.OUTAGE_RETRY_DELAY, f'Slack returned HTTP {response.status_code}')
 
-        while time.time() < start + timeout:
-            if channel in self.last_dm_channels:
-                return
+        data = json.loads(response.content)
 
-            time.sleep(0.15)
+        if not data.get('ok'):
+            logging.error(f'Failed to post message to {channel}: {data.get("error")}')
 
-        logging.info('Timed out while waiting for DM channel, attempting to create one manually')
-        self.create_dm_channels(self.last_dm_channels + [channel])
+    def send_message(self, channel: str, username: str, msg: str, priority: Priority = Priority.NORMAL,
+                     trace: Trace = NULL_TRACE):
+        trace.begin('outbound_queue')
 
-    def send_message(self, channel: str, username: str, msg: str):
-        self._api_post('chat.postMessage', channel=channel, username=username, text=msg)
+        if not self.scheduler.submit(channel, priority, channel, username, msg, trace=trace):
+            trace.finish(outcome='dropped')
 
-    def send_me_message(self, channel: str, msg: str):
-        self._api_post('chat.postMessage', channel=channel, username='* notice *', text=msg)
+    def send_me_message(self, channel: str, msg: str, priority: Priority = Priority.NORMAL,
+                        trace: Trace = NULL_TRACE):
+        self.send_message(channel, '* notice *', msg, priority, trace)
 
-    def _get_channel_by_id(self, channel_id: str):
-        slack_channels = self._api_get('channels.list').get('channels', [])
+    def outbound_stats(self):
+        return self.scheduler.stats()
 
-        for channel in slack_channels:
-            if channel.get('id') == channel_id:
-                return channel
+    async def _on_channel_created(self, **payload):
+        self.channels.put(payload.get('data').get('channel'))
 
-        return None
+    async def _on_channel_rename(self, **payload):
+        channel = payload.get('data').get('channel')
 
-    def _on_message(self, **payload):
-        if self.message_callback is not None:
-            data = payload.get('data')
+        self.channels.update(channel.get('id'), name=channel.get('name'))
 
-            # We don't want to forward any bot messages
-            if 'user' not in data:
-                return
+    async def _on_channel_archive(self, **payload):
+        self.channels.update(payload.get('data').get('channel'), is_archived=True)
 
-            has_subtype = 'subtype' in data
-            is_me_message = data.get('subtype') == 'me_message'
+    async def _on_channel_unarchive(self, **payload):
+        self.channels.update(payload.get('data').get('channel'), is_archived=False)
 
-            # Suppress all 'subtype' messages but me_message
-            if has_subtype and not is_me_message:
-                return
+    async def _on_channel_deleted(self, **payload):
+        self.channels.remove(payload.get('data').get('channel'))
 
-            # We don't want to forward slackbot messages
-            if data.get('user') == 'USLACKBOT':
-                return
+    async def _on_message(self, **payload):
+        data = payload.get('data')
 
-            channel, text = self._get_channel_by_id(data.get('channel')).get('name'), html.unescape(data.get('text'))
+        # Follows the message all the way to WeeChat
+        trace = Tracer.shared().start('slack_message', workspace=self.name, channel=data.get('channel'))
+        trace.begin('inbound_queue')
 
+        # Never block the RTM read loop, messages of a single channel are still handled in order
+        if not self.inbound.submit(data.get('channel'), self._handle_message, data, trace):
+            trace.finish(outcome='dropped')
+
+    def _handle_message(self, data: dict, trace: Trace = NULL_TRACE):
+        trace.end('inbound_queue')
+
+        if self.message_callback is None:
+            trace.finish(outcome='ignored')
+            return
+
+        # We don't want to forward any bot messages
+        if 'user' not in data:
+            trace.finish(outcome='ignored')
+            return
+
+        has_subtype = 'subtype' in data
+        is_me_message = data.get('subtype') == 'me_message'
+
+        # Suppress all 'subtype' messages but me_message
+        if has_subtype and not is_me_message:
+            trace.finish(outcome='ignored')
+            return
+
+        # We don't want to forward slackbot messages
+        if data.get('user') == 'USLACKBOT':
+            trace.finish(outcome='ignored')
+            return
+
+        with trace.span('channel_lookup'):
+            slack_channel = self.channels.get_by_id(data.get('channel'))
+
+        # Not a public channel (e.g. IM or private group), nothing to forward to
+        if slack_channel is None:
+            trace.finish(outcome='ignored')
+            return
+
+        channel, text = slack_channel.get('name'), html.unescape(data.get('text'))
+
+        with trace.span('relay_input'):
             if is_me_message:
                 self.message_callback(channel, f'/me {text}')
             else:
                 self.message_callback(channel, text)
 
-            if 'files' in data:
-                for file in data.get('files', []):
-                    status, msg = FileUpload.upload(file.get('name'), self._raw_get(file.get('url_private')),
-                                                    file.get('mimetype'))
+        if 'files' in data:
+            trace.begin('upload_queue')
 
-                    if status:
-                        self.message_callback(channel, msg)
-                    else:
-                        self.send_message(data.get('channel'), '* weerelay2slack *', msg)
+            # Uploads may take a while, don't hold back the next messages of this channel
+            if self.uploads.submit((data.get('channel'), data.get('ts')), self._upload_files, channel, data, trace):
+                return
 
-            # A silly workaround to hide forwarded messages and let them reappear once they hit relay
-            self._api_post('chat.delete', channel=data.get('channel'), ts=data.get('ts'))
+            self.send_message(data.get('channel'), '* weerelay2slack *',
+                              'Failed to upload file (too many uploads in progress)', Priority.HIGH)
+
+        trace.finish(outcome='forwarded')
+
+    def _upload_files(self, channel: str, data: dict, trace: Trace = NULL_TRACE):
+        trace.end('upload_queue')
+
+        for file in data.get('files', []):
+            with trace.span('upload'):
+                status, msg = FileUpload.upload(file.get('name'), self._raw_stream(file.get('url_private')),
+                                                file.get('size', 0), file.get('mimetype'), file.get('id'))
+
+            if status:
+                self.message_callback(channel, msg)
+            else:
+                self.send_message(data.get('channel'), '* weerelay2slack *', msg, Priority.HIGH)
+
+        trace.finish(outcome='forwarded')
 
     def set_message_callback(self, callback: callable):
         self.message_callback = callback
 
-    def _kill_me(self):
-        while current_thread().is_alive:
-            time.sleep(0.15)
+    async def run(self):
+        # Close your eyes, pretend that you don't see this code
+        await self.rtm_client._connect_and_read()
 
-        # RIP
-        self.future.cancel()
+    def stop(self):
+        # Inbound handling may still queue outgoing messages, stop it first
+        self.inbound.stop()
+        self.uploads.stop()
+        self.dm_channels.stop()
+        self.scheduler.stop()
 
-    def _run(self):
-        # Close your eyes, pretend that you don't see this code
-        self.future = asyncio.ensure_future(self.rtm_client._connect_and_read(), loop=self.rtm_client._event_loop)
-        try:
-            self.rtm_client._event_loop.run_until_complete(self.future)
-        except asyncio.CancelledError:
-            pass
-
-    def tasks(self):
-        return [
-            threading.Thread(target=self._kill_me),
-            threading.Thread(target=self._run),
-        ]
+        if self.journal is not None:
+            self.journal.close()
+
+        if self.name:
+            self.http.close()
@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+import threading
+import time
+
+
+class StateSnapshot:
+    # Bump whenever the layout of the snapshot changes, older snapshots are ignored
+    VERSION = 3
+
+    path: str
+    interval: float
+    max_age: float
+    collect: callable
+
+    def __init__(self, path: str, interval: float, max_age: float, collect: callable):
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+        self.collect = collect
+
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return None
+
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            logging.exception(f'Failed to load state snapshot from {self.path}')
+            return None
+
+        if state.get('version') != StateSnapshot.VERSION:
+            return None
+
+        age = time.time() - state.get('saved_at', 0)
+
+        if age > self.max_age:
+            logging.info(f'Ignoring state snapshot from {int(age)}s ago')
+            return None
+
+        logging.info(f'Warm start from state snapshot saved {int(age)}s ago')
+
+        return state
+
+    def save(self):
+        if not self.path:
+            return
+
+        try:
+            state = self.collect()
+            state['version'] = StateSnapshot.VERSION
+            state['saved_at'] = time.time()
+
+            with open(f'{self.path}.tmp', 'w') as f:
+                json.dump(state, f)
+
+            os.replace(f'{self.path}.tmp', self.path)
+        except Exception:
+            logging.exception(f'Failed to save state snapshot to {self.path}')
+
+    def start(self):
+        if not self.path:
+            return
+
+        self._thread = threading.Thread(target=self._run, name='state-snapshot', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+        if self._thread is not None:
+            self._thread.join()
+
+        self.save()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.save()
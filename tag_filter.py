@@ -0,0 +1,89 @@
+import re
+from functools import lru_cache
+
+
+class TagFilter:
+    # Matches the nick (taken from the nick_* tag) against a regex, has to be the last part of a filter
+    NICK_REGEX_PREFIX = 'nick~'
+
+    MEMO_SIZE = 4096
+
+    def __init__(self, filters: dict):
+        # Every tag mentioned in any filter gets its own bit
+        self._bits = {}
+
+        self._exact = {}
+        self._wildcard = []
+
+        for pattern, filter_list in filters.items():
+            rules = [rule for rule in (self._compile(filter_tags) for filter_tags in filter_list) if rule is not None]
+
+            if any(char in pattern for char in '*?'):
+                self._wildcard.append((TagFilter._translate(pattern), rules))
+            else:
+                self._exact.setdefault(pattern, []).extend(rules)
+
+        self.rules_for = lru_cache(maxsize=TagFilter.MEMO_SIZE)(self._rules_for)
+
+    @staticmethod
+    def _translate(pattern: str):
+        # Only * and ? are wildcards, IRC channel names may contain [ and ]
+        return re.compile(''.join('.*' if char == '*' else '.' if char == '?' else re.escape(char)
+                                  for char in pattern) + r'\Z', re.DOTALL)
+
+    def _compile(self, filter_tags: str):
+        nick_regex = None
+
+        if TagFilter.NICK_REGEX_PREFIX in filter_tags:
+            filter_tags, nick_regex = filter_tags.split(TagFilter.NICK_REGEX_PREFIX, 1)
+            filter_tags = filter_tags.rstrip('+')
+            nick_regex = re.compile(nick_regex)
+
+        mask = 0
+
+        for tag in filter_tags.split('+'):
+            if tag:
+                mask |= self._bits.setdefault(tag, 1 << len(self._bits))
+
+        # An empty filter never matched anything
+        if mask == 0 and nick_regex is None:
+            return None
+
+        return mask, nick_regex
+
+    def _rules_for(self, full_name: str):
+        rules = list(self._exact.get(full_name, []))
+
+        for pattern, pattern_rules in self._wildcard:
+            if pattern.match(full_name):
+                rules += pattern_rules
+
+        return tuple(rules)
+
+    def match(self, full_name: str, tags_array: list):
+        rules = self.rules_for(full_name)
+
+        # Most buffers don't have any filters at all
+        if not rules:
+            return False
+
+        mask = 0
+        nick = None
+
+        for tag in tags_array:
+            bit = self._bits.get(tag)
+
+            if bit is not None:
+                mask |= bit
+
+            if tag.startswith('nick_'):
+                nick = tag[5:]
+
+        for rule_mask, nick_regex in rules:
+            if mask & rule_mask != rule_mask:
+                continue
+
+            if nick_regex is None or (nick is not None and nick_regex.search(nick)):
+                return True
+
+        return False
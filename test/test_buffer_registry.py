@@ -0,0 +1,44 @@
+import threading
+import time
+import unittest
+
+from buffer_registry import BufferRegistry
+
+
+class Buffer:
+    def __init__(self, pointer: str, full_name: str):
+        self.pointer = pointer
+        self.full_name = full_name
+
+
+class TestBufferRegistry(unittest.TestCase):
+    def test_lookup(self):
+        registry = BufferRegistry()
+        registry.add(Buffer('0x55aa', 'irc.freenode.#lineageos'))
+
+        self.assertEqual(registry.get_by_pointer('55aa').full_name, 'irc.freenode.#lineageos')
+        self.assertEqual(registry.get_by_pointer('0x55AA').full_name, 'irc.freenode.#lineageos')
+        self.assertEqual(registry.get_by_full_name('irc.freenode.#lineageos').pointer, '0x55aa')
+
+        registry.remove(pointer='55aa')
+
+        self.assertIsNone(registry.get_by_pointer('55aa'))
+        self.assertIsNone(registry.get_by_full_name('irc.freenode.#lineageos'))
+        self.assertEqual(registry.buffers(), [])
+
+    def test_wait(self):
+        registry = BufferRegistry()
+
+        threading.Timer(0.05, registry.add, args=(Buffer('0x1', 'irc.freenode.luk'),)).start()
+
+        start = time.monotonic()
+        buffer = registry.wait_for_pointer('1', 5)
+
+        self.assertEqual(buffer.full_name, 'irc.freenode.luk')
+        self.assertLess(time.monotonic() - start, 1)
+
+        self.assertIsNone(registry.wait_for_pointer('2', 0.05))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import threading
+import unittest
+
+from channel_directory import ChannelDirectory
+
+
+class TestChannelDirectory(unittest.TestCase):
+    def setUp(self):
+        self.fetches = 0
+        self.slack_channels = [
+            {'id': 'C1', 'name': 'lineageos'},
+            {'id': 'C2', 'name': 'LineageOS-dev'},
+        ]
+
+    def fetch(self):
+        self.fetches += 1
+        return list(self.slack_channels)
+
+    def test_lookup(self):
+        directory = ChannelDirectory(self.fetch)
+        directory.refresh()
+
+        self.assertEqual(directory.get_by_id('C1').get('name'), 'lineageos')
+        self.assertEqual(directory.get_by_name('lineageos-dev').get('id'), 'C2')
+        self.assertEqual(self.fetches, 1)
+
+    def test_events(self):
+        directory = ChannelDirectory(self.fetch)
+        directory.refresh()
+
+        directory.put({'id': 'C3', 'name': 'new'})
+        directory.update('C1', name='renamed')
+        directory.update('C2', is_archived=True)
+        directory.remove('C3')
+
+        self.assertIsNone(directory.get_by_name('lineageos', refetch=False))
+        self.assertIsNone(directory.get_by_name('new', refetch=False))
+        self.assertEqual(directory.get_by_name('renamed').get('id'), 'C1')
+        self.assertTrue(directory.get_by_id('C2').get('is_archived'))
+        self.assertEqual(self.fetches, 1)
+
+    def test_refetch_on_miss(self):
+        directory = ChannelDirectory(self.fetch, refetch_interval=0)
+        directory.refresh()
+
+        self.slack_channels.append({'id': 'C3', 'name': 'created-elsewhere'})
+
+        self.assertEqual(directory.get_by_id('C3').get('name'), 'created-elsewhere')
+        self.assertEqual(self.fetches, 2)
+
+        directory.refetch_interval = 60
+
+        self.assertIsNone(directory.get_by_id('C4'))
+        self.assertEqual(self.fetches, 2)
+
+    def test_single_flight(self):
+        entered = threading.Event()
+        release = threading.Event()
+
+        def fetch():
+            entered.set()
+            release.wait(5)
+            return self.fetch()
+
+        directory = ChannelDirectory(fetch, refetch_interval=0)
+        self.slack_channels.append({'id': 'D1', 'name': 'dm'})
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(directory.get_by_id('D1'))) for _ in range(4)]
+        threads[0].start()
+        entered.wait(5)
+
+        # Misses during a fetch wait for it, then look up again
+        for thread in threads[1:]:
+            thread.start()
+
+        release.set()
+
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual([channel.get('name') for channel in results], ['dm'] * 4)
+        self.assertEqual(self.fetches, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import threading
+import time
+import unittest
+
+from dispatcher import Dispatcher
+
+
+class TestDispatcher(unittest.TestCase):
+    def test_order(self):
+        dispatcher = Dispatcher('test', 4, 1000)
+        dispatcher.start()
+
+        lock = threading.Lock()
+        results = {}
+
+        def handle(key: str, i: int):
+            time.sleep(0.001)
+
+            with lock:
+                results.setdefault(key, []).append(i)
+
+        for i in range(50):
+            for key in ['a', 'b', 'c']:
+                dispatcher.submit(key, handle, key, i)
+
+        while dispatcher.pending() > 0:
+            time.sleep(0.01)
+
+        dispatcher.stop()
+
+        for key in ['a', 'b', 'c']:
+            self.assertEqual(results[key], list(range(50)))
+
+    def test_stop(self):
+        dispatcher = Dispatcher('test', 2, 1000)
+        dispatcher.start()
+
+        lock = threading.Lock()
+        results = []
+
+        def handle(key: str, i: int):
+            time.sleep(0.001)
+
+            with lock:
+                results.append((key, i))
+
+        for i in range(20):
+            for key in ['a', 'b', 'c']:
+                dispatcher.submit(key, handle, key, i)
+
+        # Flushes everything queued so far
+        dispatcher.stop()
+
+        self.assertEqual(len(results), 60)
+        self.assertEqual(dispatcher.pending(), 0)
+        self.assertFalse(dispatcher.submit('a', handle, 'a', 20))
+
+    def test_queue_limit(self):
+        dispatcher = Dispatcher('test', 1, 2)
+
+        self.assertTrue(dispatcher.submit('a', print))
+        self.assertTrue(dispatcher.submit('b', print))
+        self.assertFalse(dispatcher.submit('c', print))
+        self.assertEqual(dispatcher.dropped, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+from dm_reconciler import DmChannelReconciler
+
+
+class TestDmChannelReconciler(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def ensure(self, channel: str):
+        self.calls.append(('ensure', channel))
+        return True
+
+    def archive(self, channel: str):
+        self.calls.append(('archive', channel))
+
+    def test_delta(self):
+        reconciler = DmChannelReconciler(self.ensure, self.archive, 60)
+        reconciler.set_desired(['_dm_a', '_dm_b'])
+        reconciler.apply()
+
+        self.assertEqual(self.calls, [('ensure', '_dm_a'), ('ensure', '_dm_b')])
+
+        self.calls.clear()
+        reconciler.add('_dm_c')
+        reconciler.remove('_dm_a')
+        reconciler.remove('_dm_b')
+        reconciler.add('_dm_b')
+        reconciler.apply()
+
+        self.assertEqual(self.calls, [('ensure', '_dm_c'), ('archive', '_dm_a')])
+        self.assertEqual(reconciler.channels(), ['_dm_b', '_dm_c'])
+
+    def test_seed(self):
+        reconciler = DmChannelReconciler(self.ensure, self.archive, 60)
+        reconciler.seed(['_dm_a', '_dm_b'])
+
+        self.assertTrue(reconciler.wait_for('_dm_a', 0))
+
+        reconciler.set_desired(['_dm_a', '_dm_c'])
+        reconciler.forget(['_dm_a'])
+        reconciler.apply()
+
+        self.assertEqual(self.calls, [('ensure', '_dm_a'), ('ensure', '_dm_c'), ('archive', '_dm_b')])
+        self.assertEqual(reconciler.applied(), ['_dm_a', '_dm_c'])
+
+    def test_wait_for(self):
+        reconciler = DmChannelReconciler(self.ensure, self.archive, 0.01)
+        reconciler.start()
+
+        self.assertTrue(reconciler.wait_for('_dm_a', 5))
+        self.assertEqual(self.calls, [('ensure', '_dm_a')])
+
+        reconciler.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
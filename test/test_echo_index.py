@@ -0,0 +1,52 @@
+import time
+import unittest
+
+from echo_index import EchoIndex
+
+
+class TestEchoIndex(unittest.TestCase):
+    def test_match(self):
+        echoes = EchoIndex(30)
+        echoes.add('irc.freenode.#a', 'hello  world ')
+        echoes.add('irc.freenode.#a', 'hello world')
+
+        self.assertFalse(echoes.match('irc.freenode.#b', 'hello world'))
+        self.assertFalse(echoes.match('irc.freenode.#a', 'world'))
+        self.assertTrue(echoes.match('irc.freenode.#a', 'hello world'))
+        self.assertTrue(echoes.match('irc.freenode.#a', 'hello world'))
+        self.assertFalse(echoes.match('irc.freenode.#a', 'hello world'))
+        self.assertEqual(len(echoes), 0)
+
+    def test_fold(self):
+        first, second = 'a very long message ' * 20, 'split by WeeChat ' * 20
+
+        echoes = EchoIndex(30)
+        echoes.add('irc.freenode.#a', first + second + 'twice')
+
+        self.assertTrue(echoes.match('irc.freenode.#a', first))
+        self.assertTrue(echoes.match('irc.freenode.#a', second))
+        self.assertEqual(len(echoes), 1)
+
+        self.assertTrue(echoes.match('irc.freenode.#a', 'twice'))
+        self.assertEqual(len(echoes), 0)
+
+    def test_short_prefix(self):
+        echoes = EchoIndex(30)
+        echoes.add('irc.freenode.#a', 'hello')
+
+        # Sent from another client on the same nick, far too short to be split
+        self.assertFalse(echoes.match('irc.freenode.#a', 'he'))
+        self.assertTrue(echoes.match('irc.freenode.#a', 'hello'))
+
+    def test_ttl(self):
+        echoes = EchoIndex(0.05)
+        echoes.add('irc.freenode.#a', 'hello')
+
+        time.sleep(0.1)
+
+        self.assertFalse(echoes.match('irc.freenode.#a', 'hello'))
+        self.assertEqual(len(echoes), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import asyncio
+import socket
+import struct
+import threading
+import unittest
+
+import requests
+
+from loadtest.fake_relay import FakeRelay, RelayProtocol
+from loadtest.fake_slack import FakeSlack
+from relay_reader import RelayReader
+
+
+class TestRelayProtocol(unittest.TestCase):
+    def test_message(self):
+        frame = RelayProtocol.message('_pong', b'str' + RelayProtocol.str('x'))
+
+        self.assertEqual(frame, struct.pack('>I', 22) + b'\x00' + struct.pack('>I', 5) + b'_pong' +
+                         b'str' + struct.pack('>I', 1) + b'x')
+
+    def test_hda(self):
+        hda = RelayProtocol.hda('buffer', [('number', 'int'), ('full_name', 'str')], [(['1a'], {
+            'number': 1,
+            'full_name': 'core.weechat',
+        })])
+
+        self.assertEqual(hda, b'hda' + RelayProtocol.str('buffer') + RelayProtocol.str('number:int,full_name:str') +
+                         struct.pack('>I', 1) + b'\x021a' + struct.pack('>i', 1) + RelayProtocol.str('core.weechat'))
+
+
+class TestFakeRelay(unittest.TestCase):
+    def test_session(self):
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+
+        relay = FakeRelay('secret', ['irc.load.#a', 'irc.load.#b'])
+        asyncio.run_coroutine_threadsafe(relay.start(), loop).result()
+
+        sock = socket.create_connection(('127.0.0.1', relay.port))
+        sock.setblocking(False)
+        reader = RelayReader(sock)
+
+        sock.sendall(b'init password=secret\r\nping\r\n(x) hdata buffer:gui_buffers(*) full_name\r\n')
+
+        frames = []
+
+        while len(frames) < 2:
+            frames += reader.read(5)
+
+        self.assertIn(b'_pong', frames[0])
+        self.assertEqual(frames[1][5:10], RelayProtocol.str('x'))
+        self.assertIn(b'irc.load.#b', frames[1])
+
+        sock.sendall(b'sync *\r\ninput irc.load.#a hello\r\n')
+
+        while not relay.inputs:
+            reader.read(0.01)
+
+        self.assertTrue(relay.is_synced())
+        self.assertEqual(relay.inputs[0][:2], ('irc.load.#a', 'hello'))
+
+        reader.close()
+        sock.close()
+
+        asyncio.run_coroutine_threadsafe(relay.stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+
+class TestFakeSlack(unittest.TestCase):
+    def test_rate_limit(self):
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+
+        slack = FakeSlack('token', rate_limit=2)
+        asyncio.run_coroutine_threadsafe(slack.start(), loop).result()
+
+        headers = {'Authorization': 'Bearer token'}
+
+        self.assertFalse(requests.get(f'{slack.api_url}auth.test').json().get('ok'))
+        self.assertTrue(requests.get(f'{slack.api_url}auth.test', headers=headers).json().get('ok'))
+
+        channel = requests.post(f'{slack.api_url}channels.create', data={'name': 'a'}, headers=headers).json()
+        self.assertTrue(channel.get('ok'))
+
+        statuses = [requests.post(f'{slack.api_url}chat.postMessage', data={'channel': 'a', 'text': str(i)},
+                                  headers=headers).status_code for i in range(5)]
+
+        self.assertIn(429, statuses)
+        self.assertEqual(len(slack.messages), statuses.count(200))
+        self.assertEqual(slack.rate_limited, statuses.count(429))
+
+        asyncio.run_coroutine_threadsafe(slack.stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import asyncio
+import socket
+import unittest
+
+import aiohttp
+
+from metrics import Counter, Gauge, Histogram, MetricsServer
+
+
+class TestMetrics(unittest.TestCase):
+    def test_counter(self):
+        counter = Counter('test_counter_total', 'Test counter', ('tag',))
+        counter.labels('irc_join').inc()
+        counter.labels('irc_join').inc()
+        counter.labels('irc_privmsg').inc(3)
+
+        self.assertEqual(counter.render(), [
+            '# HELP test_counter_total Test counter',
+            '# TYPE test_counter_total counter',
+            'test_counter_total{tag="irc_join"} 2',
+            'test_counter_total{tag="irc_privmsg"} 3',
+        ])
+
+    def test_gauge(self):
+        depth = [5]
+
+        gauge = Gauge('test_gauge', 'Test gauge')
+        gauge.set_function(lambda: depth[0])
+        depth[0] = 7
+
+        self.assertEqual(gauge.render()[-1], 'test_gauge 7')
+
+    def test_histogram(self):
+        histogram = Histogram('test_seconds', 'Test histogram', buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        self.assertEqual(histogram.render()[2:], [
+            'test_seconds_bucket{le="0.1"} 1',
+            'test_seconds_bucket{le="1"} 2',
+            'test_seconds_bucket{le="+Inf"} 3',
+            'test_seconds_sum 5.55',
+            'test_seconds_count 3',
+        ])
+
+    def test_server(self):
+        Counter('test_server_total', 'Test server').inc()
+
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+
+        async def scrape():
+            task = asyncio.ensure_future(MetricsServer('127.0.0.1', port).run())
+
+            try:
+                for _ in range(100):
+                    try:
+                        async with aiohttp.ClientSession() as session:
+                            async with session.get(f'http://127.0.0.1:{port}/metrics') as response:
+                                return await response.text()
+                    except aiohttp.ClientConnectionError:
+                        await asyncio.sleep(0.01)
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+        loop = asyncio.new_event_loop()
+
+        try:
+            text = loop.run_until_complete(scrape())
+        finally:
+            loop.close()
+
+        self.assertIn('test_server_total 1\n', text)
+        self.assertIn('# TYPE threads gauge\n', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from http_transport import HttpTransport
+from multipart_stream import MultipartStream, UploadAborted
+
+
+class TestMultipartStream(unittest.TestCase):
+    def test_body(self):
+        stream = MultipartStream('files[]', 'a "b".txt', 'text/plain', iter([b'hello ', b'world']), 11)
+        boundary = stream.content_type.split('boundary=')[1]
+        body = b''.join(stream)
+
+        self.assertEqual(len(body), len(stream))
+        self.assertEqual(body, (f'--{boundary}\r\n'
+                                f'Content-Disposition: form-data; name="files[]"; filename="a %22b%22.txt"\r\n'
+                                f'Content-Type: text/plain\r\n'
+                                f'\r\n'
+                                f'hello world\r\n'
+                                f'--{boundary}--\r\n').encode())
+
+    def test_abort(self):
+        closed = []
+
+        def chunks(data: list):
+            try:
+                yield from data
+            finally:
+                closed.append(True)
+
+        with self.assertRaises(UploadAborted):
+            b''.join(MultipartStream('file', 'a', 'text/plain', chunks([b'hello ', b'world']), 5))
+
+        with self.assertRaises(UploadAborted):
+            b''.join(MultipartStream('file', 'a', 'text/plain', chunks([b'hello']), 11))
+
+        self.assertEqual(closed, [True, True])
+
+    def test_post(self):
+        received = {}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                received['headers'] = self.headers
+                received['body'] = self.rfile.read(int(self.headers['Content-Length']))
+
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.handle_request, daemon=True).start()
+
+        stream = MultipartStream('file', 'a.bin', 'application/octet-stream', (b'x' * 1000 for _ in range(100)), 100000)
+
+        transport = HttpTransport(1, 5, 0)
+        response = transport.post(f'http://127.0.0.1:{server.server_port}/put', data=stream,
+                                  headers={'Content-Type': stream.content_type})
+        transport.close()
+        server.server_close()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(received['headers']['Transfer-Encoding'])
+        self.assertEqual(int(received['headers']['Content-Length']), len(stream))
+        self.assertEqual(len(received['body']), len(stream))
+        self.assertIn(b'x' * 100000, received['body'])
+
+
+if __name__ == '__main__':
+    unittest.main()
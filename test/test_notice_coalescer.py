@@ -0,0 +1,60 @@
+import threading
+import unittest
+
+from notice_coalescer import NoticeCoalescer
+
+
+class TestNoticeCoalescer(unittest.TestCase):
+    def setUp(self):
+        self.emitted = []
+        self.event = threading.Event()
+
+    def emit(self, channel: str, msg: str):
+        self.emitted.append((channel, msg))
+        self.event.set()
+
+    def test_single(self):
+        coalescer = NoticeCoalescer(self.emit, 0.05, 1, 100)
+        coalescer.start()
+        coalescer.add('a', ['irc_join', 'nick_luk'], 'luk has joined #a')
+
+        self.assertTrue(self.event.wait(5))
+        coalescer.stop()
+
+        self.assertEqual(self.emitted, [('a', 'luk has joined #a')])
+
+    def test_netsplit(self):
+        coalescer = NoticeCoalescer(self.emit, 60, 60, 5)
+
+        coalescer.add('a', ['irc_join', 'nick_a'], 'a has joined #a')
+        coalescer.add('a', ['irc_join', 'nick_b'], 'b has joined #a')
+
+        for nick in ['c', 'd', 'e']:
+            coalescer.add('a', ['irc_quit', f'nick_{nick}'], f'{nick} (~{nick}@host) has quit (*.net *.split)')
+
+        self.assertEqual(self.emitted, [('a', '2 joined: a, b; 3 quit (netsplit): c, d, e')])
+
+    def test_passthrough_flushes(self):
+        coalescer = NoticeCoalescer(self.emit, 60, 60, 100)
+
+        coalescer.add('a', ['irc_join', 'nick_a'], 'a has joined #a')
+        coalescer.add('b', ['irc_join', 'nick_b'], 'b has joined #b')
+        coalescer.add('a', ['irc_topic', 'nick_c'], 'c has changed topic')
+
+        self.assertEqual(self.emitted, [('a', 'a has joined #a'), ('a', 'c has changed topic')])
+
+        coalescer.stop()
+
+        self.assertEqual(self.emitted[-1], ('b', 'b has joined #b'))
+
+    def test_summarize(self):
+        coalescer = NoticeCoalescer(self.emit, 1, 1, 100)
+        lines = [('irc_quit', f'n{i}', f'n{i} has quit (Ping timeout)') for i in range(12)]
+        lines.append(('irc_quit', 'x', 'x has quit (irc.a.net irc.b.net)'))
+
+        self.assertEqual(coalescer.summarize(lines),
+                         '13 quit (1 netsplit): n0, n1, n2, n3, n4, n5, n6, n7, n8, n9 and 3 more')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from outbound_journal import OutboundJournal
+from outbound_scheduler import OutboundScheduler, Priority, RetryLater
+
+
+class FailingConnection:
+    # sqlite3.Connection methods are read-only, fail the first executemany() through a proxy
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+        self.failures = 1
+
+    def executemany(self, *args):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError('disk I/O error')
+
+        return self.db.executemany(*args)
+
+    def __getattr__(self, name: str):
+        return getattr(self.db, name)
+
+
+class TestOutboundJournal(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'outbound.sqlite3')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_persist(self):
+        journal = OutboundJournal(self.path, 60, 1000)
+        first = journal.append('a', Priority.NORMAL, ('a', 'nick', 'hello'))
+        journal.append('b', Priority.HIGH, ('b', 'nick', 'world'))
+        third = journal.append('a', Priority.LOW, ('a', 'nick', 'joined'))
+        journal.close()
+
+        journal = OutboundJournal(self.path, 60, 1000)
+        self.assertEqual([entry[1:4] for entry in journal.load()], [
+            ('a', Priority.NORMAL, ['a', 'nick', 'hello']),
+            ('b', Priority.HIGH, ['b', 'nick', 'world']),
+            ('a', Priority.LOW, ['a', 'nick', 'joined']),
+        ])
+
+        journal.ack(first)
+        journal.ack(third)
+        self.assertGreater(journal.append('c', Priority.NORMAL, ('c', 'nick', 'new')), third)
+        journal.close()
+
+        journal = OutboundJournal(self.path, 60, 1000)
+        self.assertEqual([entry[1] for entry in journal.load()], ['b', 'c'])
+        journal.close()
+
+    def test_flush_failure(self):
+        journal = OutboundJournal(self.path, 60, 1000)
+        first = journal.append('a', Priority.NORMAL, ('a', 'nick', 'hello'))
+        second = journal.append('a', Priority.NORMAL, ('a', 'nick', 'world'))
+        journal._db = FailingConnection(journal._db)
+
+        with self.assertLogs(level='ERROR'):
+            journal._flush()
+
+        # Written with the next flush instead
+        third = journal.append('b', Priority.NORMAL, ('b', 'nick', 'new'))
+        journal.ack(first)
+        journal._flush()
+        self.assertEqual([entry[0] for entry in journal.load()], [second, third])
+
+        journal.ack(second)
+        journal._db.failures = 1
+
+        with self.assertLogs(level='ERROR'):
+            journal._flush()
+
+        # The ack is retried as well, no duplicates on the next start
+        journal.close()
+
+        journal = OutboundJournal(self.path, 60, 1000)
+        self.assertEqual([entry[0] for entry in journal.load()], [third])
+        journal.close()
+
+    def test_replay(self):
+        journal = OutboundJournal(self.path, 60, 1000)
+        scheduler = OutboundScheduler('test', None, 1000, 1000, 1, 100, journal)
+        scheduler.submit('a', Priority.NORMAL, 'hello')
+        scheduler.submit('a', Priority.NORMAL, 'world')
+        journal.close()
+
+        sent = []
+        done = threading.Event()
+
+        def send(msg: str):
+            # Slack is down for the first attempt
+            if not sent:
+                sent.append(None)
+                raise RetryLater(0.1)
+
+            sent.append(msg)
+
+            if len(sent) == 3:
+                done.set()
+
+        journal = OutboundJournal(self.path, 60, 1000)
+        scheduler = OutboundScheduler('test', send, 1000, 1000, 1, 100, journal)
+        scheduler.restore()
+        scheduler.start()
+
+        self.assertTrue(done.wait(5))
+        scheduler.stop()
+        journal.close()
+
+        self.assertEqual(sent, [None, 'hello', 'world'])
+        self.assertEqual(scheduler.stats().get('retried'), 1)
+        self.assertEqual(OutboundJournal(self.path, 60, 1000).load(), [])
+
+    def test_queue_limit(self):
+        journal = OutboundJournal(self.path, 60, 1000)
+        scheduler = OutboundScheduler('test', None, 1000, 1000, 1, 2, journal)
+
+        self.assertTrue(scheduler.submit('a', Priority.LOW, 'joined'))
+        self.assertTrue(scheduler.submit('a', Priority.NORMAL, 'hello'))
+        self.assertFalse(scheduler.submit('a', Priority.LOW, 'quit'))
+        self.assertTrue(scheduler.submit('a', Priority.HIGH, 'highlight'))
+        journal.close()
+
+        self.assertEqual(scheduler.stats().get('dropped'), 2)
+        self.assertEqual([entry[3] for entry in OutboundJournal(self.path, 60, 1000).load()],
+                         [['hello'], ['highlight']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import threading
+import time
+import unittest
+
+from outbound_scheduler import OutboundScheduler, Priority, RateLimited, TokenBucket
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test(self):
+        bucket = TokenBucket(1, 2)
+        now = bucket.updated
+
+        self.assertEqual(bucket.delay(now), 0)
+        bucket.take(now)
+        bucket.take(now)
+        self.assertAlmostEqual(bucket.delay(now), 1)
+        self.assertAlmostEqual(bucket.delay(now + 0.5), 0.5)
+        self.assertEqual(bucket.delay(now + 1), 0)
+
+        bucket.pause(now + 10)
+        self.assertAlmostEqual(bucket.delay(now + 1), 9)
+
+
+class TestOutboundScheduler(unittest.TestCase):
+    def test_priority(self):
+        sent = []
+        done = threading.Event()
+
+        def send(msg: str):
+            sent.append(msg)
+
+            if len(sent) == 4:
+                done.set()
+
+        scheduler = OutboundScheduler('test', send, 1000, 1000, 1, 100)
+        scheduler.submit('a', Priority.LOW, 'quit')
+        scheduler.submit('a', Priority.NORMAL, 'hello')
+        scheduler.submit('a', Priority.LOW, 'join')
+        scheduler.submit('b', Priority.HIGH, 'highlight')
+        scheduler.start()
+
+        self.assertTrue(done.wait(5))
+        scheduler.stop()
+
+        # Channel a is still posted in order
+        self.assertEqual(sent, ['highlight', 'quit', 'hello', 'join'])
+        self.assertEqual(scheduler.stats().get('sent'), 4)
+
+    def test_channel_order(self):
+        sent = []
+        done = threading.Event()
+
+        def send(channel: str, msg: str):
+            sent.append((channel, msg))
+
+            if len(sent) == 4:
+                done.set()
+
+        scheduler = OutboundScheduler('test', send, 1000, 1000, 1, 100)
+        scheduler.submit('a', Priority.NORMAL, 'a', 'hello')
+        scheduler.submit('b', Priority.NORMAL, 'b', 'hi')
+        scheduler.submit('a', Priority.NORMAL, 'a', 'world')
+        scheduler.submit('a', Priority.HIGH, 'a', 'highlight')
+        scheduler.start()
+
+        self.assertTrue(done.wait(5))
+        scheduler.stop()
+
+        # A highlight brings its channel forward, without overtaking what is queued for it
+        self.assertEqual(sent, [('a', 'hello'), ('a', 'world'), ('a', 'highlight'), ('b', 'hi')])
+
+    def test_evict_low_priority(self):
+        scheduler = OutboundScheduler('test', None, 1000, 1000, 1, 3)
+        scheduler.submit('a', Priority.NORMAL, 'hello')
+        scheduler.submit('a', Priority.LOW, 'join')
+        scheduler.submit('b', Priority.LOW, 'quit')
+
+        self.assertTrue(scheduler.submit('a', Priority.NORMAL, 'world'))
+        self.assertFalse(scheduler.submit('a', Priority.LOW, 'part'))
+        self.assertEqual(scheduler.stats().get('queue_depth_by_priority'), {'high': 0, 'normal': 2, 'low': 1})
+        self.assertEqual([item[3] for item in scheduler._channels['a'].queue], [('hello',), ('world',)])
+
+    def test_retry_after(self):
+        attempts = []
+        done = threading.Event()
+
+        def send(msg: str):
+            attempts.append(time.monotonic())
+
+            if len(attempts) == 1:
+                raise RateLimited(0.2)
+
+            done.set()
+
+        scheduler = OutboundScheduler('test', send, 1000, 1000, 2, 100)
+        scheduler.start()
+        scheduler.submit('a', Priority.NORMAL, 'hello')
+
+        self.assertTrue(done.wait(5))
+        scheduler.stop()
+
+        self.assertGreaterEqual(attempts[1] - attempts[0], 0.2)
+        self.assertEqual(scheduler.stats().get('rate_limited'), 1)
+        self.assertEqual(scheduler.stats().get('queue_depth'), 0)
+
+    def test_stop(self):
+        sent = []
+
+        scheduler = OutboundScheduler('test', lambda msg: sent.append(msg), 1000, 1000, 2, 100)
+        scheduler.start()
+
+        for i in range(20):
+            scheduler.submit(f'chan{i % 3}', Priority.NORMAL, i)
+
+        # Flushes everything queued so far
+        scheduler.stop()
+
+        self.assertEqual(sorted(sent), list(range(20)))
+        self.assertEqual(scheduler.stats().get('queue_depth'), 0)
+
+    def test_stop_timeout(self):
+        sent = []
+
+        scheduler = OutboundScheduler('test', lambda msg: sent.append(msg), 1, 1, 1, 100)
+        scheduler.start()
+
+        for i in range(3):
+            scheduler.submit('a', Priority.NORMAL, i)
+
+        with self.assertLogs(level='WARNING') as logs:
+            scheduler.stop(0.2)
+
+        self.assertEqual(sent, [0])
+        self.assertIn('dropped 2 undelivered message(s)', logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import socket
+import struct
+import unittest
+
+from relay_reader import RelayReader
+
+
+def frame(payload: bytes):
+    return struct.pack('>I', len(payload) + 4) + payload
+
+
+class TestRelayReader(unittest.TestCase):
+    def test_feed(self):
+        sock = socket.socket()
+        reader = RelayReader(sock)
+
+        data = frame(b'\x00first') + frame(b'\x00second')
+
+        self.assertEqual(reader.feed(data[:3]), [])
+        self.assertEqual(reader.feed(data[3:12]), [frame(b'\x00first')])
+        self.assertEqual(reader.feed(data[12:]), [frame(b'\x00second')])
+
+        reader.close()
+        sock.close()
+
+    def test_read(self):
+        a, b = socket.socketpair()
+        a.setblocking(False)
+
+        reader = RelayReader(a)
+        b.sendall(frame(b'\x00one') + frame(b'\x00two') + frame(b'\x00thr'))
+
+        self.assertEqual(reader.read(1), [frame(b'\x00one'), frame(b'\x00two'), frame(b'\x00thr')])
+
+        self.assertEqual(reader.read(0.01), [])
+        self.assertEqual(reader.read_available(), [])
+
+        b.close()
+
+        with self.assertRaises(ConnectionError):
+            reader.read(1)
+
+        reader.close()
+        a.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
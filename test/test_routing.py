@@ -0,0 +1,47 @@
+import unittest
+
+from routing import RoutingTable
+
+
+class TestRoutingTable(unittest.TestCase):
+    def setUp(self):
+        self.routing = RoutingTable({
+            'irc.freenode.#lineageos': 'lineageos',
+            'irc.freenode.#lineageos-dev': 'lineageos-dev',
+        }, {
+            'irc.freenode.': '_freenode_dm_',
+            'irc.free': '_free_dm_',
+            'irc.oftc.': '_oftc_dm_',
+        })
+
+    def test_forward(self):
+        self.assertEqual(self.routing.slack_channel_for_buffer('irc.freenode.#lineageos'), 'lineageos')
+        self.assertEqual(self.routing.slack_channel_for_buffer('irc.freenode.LuK1337'), '_freenode_dm_luk1337')
+        self.assertIsNone(self.routing.slack_channel_for_buffer('irc.oftc.#unmapped'))
+
+    def test_dm_channel_for_buffer(self):
+        self.assertEqual(self.routing.dm_channel_for_buffer('irc.oftc.some.one'), '_oftc_dm_some_one')
+        self.assertEqual(self.routing.dm_channel_for_buffer('irc.freebsd.luk'), '_free_dm_bsd_luk')
+        self.assertIsNone(self.routing.dm_channel_for_buffer('irc.oftc.#channel'))
+        self.assertIsNone(self.routing.dm_channel_for_buffer('irc.efnet.luk'))
+        self.assertIsNone(self.routing.dm_channel_for_buffer('irc.'))
+        self.assertEqual(self.routing.dm_channel_for_buffer('irc.freenode.' + 'x' * 100), '_freenode_dm_' + 'x' * 80)
+
+    def test_config_order(self):
+        # First configured prefix wins, later ones are only tried if it yields a channel name
+        self.assertEqual(self.routing.dm_channel_for_buffer('irc.freenode.luk'), '_freenode_dm_luk')
+        self.assertEqual(self.routing.dm_channel_for_buffer('irc.freenode.#chan'), '_free_dm_node_#chan')
+
+    def test_reverse(self):
+        self.assertEqual(self.routing.buffer_for_slack_channel('lineageos-dev'), 'irc.freenode.#lineageos-dev')
+        self.assertIsNone(self.routing.buffer_for_slack_channel('_freenode_dm_luk'))
+
+        self.routing.add_dm('_freenode_dm_luk', 'irc.freenode.luk')
+        self.assertEqual(self.routing.buffer_for_slack_channel('_freenode_dm_luk'), 'irc.freenode.luk')
+
+        self.routing.remove_dm('_freenode_dm_luk')
+        self.assertIsNone(self.routing.buffer_for_slack_channel('_freenode_dm_luk'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import asyncio
+import os
+import signal
+import threading
+import unittest
+
+from runtime import Runtime
+
+
+class TestRuntime(unittest.TestCase):
+    def test_failure_stops_everything(self):
+        runtime = Runtime()
+        cancelled = []
+
+        async def forever():
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def fail():
+            raise ConnectionResetError()
+
+        runtime.spawn(forever())
+        runtime.spawn(fail())
+
+        with self.assertLogs(level='ERROR'):
+            runtime.run()
+
+        self.assertEqual(cancelled, [True])
+
+    def test_stop_from_thread(self):
+        runtime = Runtime()
+        runtime.spawn(asyncio.sleep(60))
+
+        threading.Timer(0.05, runtime.stop).start()
+        runtime.run()
+
+        self.assertTrue(runtime.loop.is_closed())
+
+    def test_signal(self):
+        runtime = Runtime()
+        received = []
+
+        def on_signal():
+            received.append(True)
+            runtime.stop()
+
+        runtime.on_signal(signal.SIGUSR1, on_signal)
+        runtime.spawn(asyncio.sleep(60))
+
+        threading.Timer(0.05, os.kill, (os.getpid(), signal.SIGUSR1)).start()
+        runtime.run()
+
+        self.assertEqual(received, [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
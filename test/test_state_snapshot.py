@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from state_snapshot import StateSnapshot
+
+
+class TestStateSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'state.json')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_save_load(self):
+        state = {'routing': {'_freenode_dm_nick': 'irc.freenode.nick'}}
+
+        snapshot = StateSnapshot(self.path, 60, 60, lambda: dict(state))
+        self.assertIsNone(snapshot.load())
+
+        snapshot.start()
+        snapshot.stop()
+
+        self.assertEqual(snapshot.load().get('routing'), state.get('routing'))
+
+    def test_stale(self):
+        with open(self.path, 'w') as f:
+            json.dump({'version': StateSnapshot.VERSION, 'saved_at': time.time() - 120}, f)
+
+        self.assertIsNone(StateSnapshot(self.path, 60, 60, dict).load())
+        self.assertIsNotNone(StateSnapshot(self.path, 60, 300, dict).load())
+
+        with open(self.path, 'w') as f:
+            json.dump({'version': StateSnapshot.VERSION + 1, 'saved_at': time.time()}, f)
+
+        self.assertIsNone(StateSnapshot(self.path, 60, 300, dict).load())
+
+    def test_periodic(self):
+        calls = []
+
+        def collect():
+            calls.append(None)
+            return {}
+
+        snapshot = StateSnapshot(self.path, 0.01, 60, collect)
+        snapshot.start()
+
+        time.sleep(0.2)
+        snapshot.stop()
+
+        self.assertGreater(len(calls), 2)
+
+    def test_disabled(self):
+        snapshot = StateSnapshot('', 60, 60, dict)
+        snapshot.start()
+        snapshot.stop()
+
+        self.assertIsNone(snapshot.load())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+from tag_filter import TagFilter
+
+
+class TestTagFilter(unittest.TestCase):
+    def setUp(self):
+        self.filters = TagFilter({
+            'irc.freenode.#lineageos': [
+                'nick_test+irc_join',
+                'nick_test+irc_quit',
+                '',
+            ],
+            'irc.freenode.#*': [
+                'irc_mode',
+            ],
+            'irc.*': [
+                'irc_privmsg+nick~^.*bot$',
+            ],
+            'irc.oftc.#[x]': [
+                'irc_join',
+            ],
+        })
+
+    def test_exact(self):
+        self.assertTrue(self.filters.match('irc.freenode.#lineageos', ['irc_join', 'nick_test', 'log4']))
+        self.assertFalse(self.filters.match('irc.freenode.#lineageos', ['irc_join', 'nick_luk', 'log4']))
+        self.assertFalse(self.filters.match('irc.freenode.#lineageos', ['irc_privmsg', 'nick_test']))
+        self.assertFalse(self.filters.match('irc.freenode.#lineageos', []))
+
+    def test_wildcard(self):
+        self.assertTrue(self.filters.match('irc.freenode.#lineageos', ['irc_mode']))
+        self.assertTrue(self.filters.match('irc.freenode.#lineageos-dev', ['irc_mode', 'nick_luk']))
+        self.assertFalse(self.filters.match('irc.oftc.#lineageos', ['irc_mode']))
+        self.assertFalse(self.filters.match('irc.freenode.#lineageos-dev', ['irc_join', 'nick_test']))
+
+    def test_brackets(self):
+        self.assertTrue(self.filters.match('irc.oftc.#[x]', ['irc_join']))
+        self.assertFalse(self.filters.match('irc.oftc.#x', ['irc_join']))
+
+    def test_nick_regex(self):
+        self.assertTrue(self.filters.match('irc.oftc.#channel', ['irc_privmsg', 'nick_gerritbot']))
+        self.assertFalse(self.filters.match('irc.oftc.#channel', ['irc_privmsg', 'nick_luk']))
+        self.assertFalse(self.filters.match('irc.oftc.#channel', ['irc_join', 'nick_gerritbot']))
+        self.assertFalse(self.filters.match('irc.oftc.#channel', ['irc_privmsg']))
+
+
+if __name__ == '__main__':
+    unittest.main()
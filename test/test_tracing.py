@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from outbound_scheduler import OutboundScheduler, Priority
+from tracing import NULL_TRACE, SamplingProfiler, Tracer
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'slow_traces.jsonl')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return []
+
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_slow(self):
+        tracer = Tracer(self.path, 0.05)
+
+        trace = tracer.start('relay_line', buffer='abc')
+        trace.begin('relay_queue')
+        time.sleep(0.06)
+        trace.end('relay_queue')
+
+        with trace.span('filter'):
+            pass
+
+        with self.assertLogs(level='WARNING'):
+            trace.finish(outcome='filtered')
+
+        # Only once
+        trace.finish()
+
+        fast = tracer.start('relay_line')
+        fast.finish()
+
+        traces = self.read()
+
+        self.assertEqual(len(traces), 1)
+        self.assertEqual(traces[0].get('id'), trace.id)
+        self.assertEqual(traces[0].get('buffer'), 'abc')
+        self.assertEqual(traces[0].get('outcome'), 'filtered')
+        self.assertEqual([span.get('name') for span in traces[0].get('spans')], ['relay_queue', 'filter'])
+        self.assertGreaterEqual(traces[0].get('spans')[0].get('duration_ms'), 50)
+
+    def test_disabled(self):
+        self.assertIs(Tracer('', 0).start('relay_line'), NULL_TRACE)
+
+    def test_scheduler(self):
+        done = threading.Event()
+
+        scheduler = OutboundScheduler('test', lambda msg: time.sleep(0.02), 1000, 1000, 1, 100)
+        scheduler.start()
+
+        trace = Tracer(self.path, 0)
+        trace = trace.start('relay_line')
+        trace.begin('outbound_queue')
+
+        finish = trace.finish
+        trace.finish = lambda **attrs: (finish(**attrs), done.set())
+
+        scheduler.submit('a', Priority.NORMAL, 'hello', trace=trace)
+
+        self.assertTrue(done.wait(5))
+        scheduler.stop()
+
+        traces = self.read()
+
+        self.assertEqual(traces[0].get('outcome'), 'sent')
+        self.assertEqual([span.get('name') for span in traces[0].get('spans')], ['outbound_queue', 'send'])
+
+    def test_profiler(self):
+        path = os.path.join(self.dir.name, 'profile.txt')
+        stop = threading.Event()
+
+        def busy():
+            while not stop.is_set():
+                sum(range(1000))
+
+        thread = threading.Thread(target=busy, name='busy')
+        thread.start()
+
+        profiler = SamplingProfiler(path, 0.001)
+        profiler.toggle()
+        time.sleep(0.1)
+        profiler.toggle()
+
+        stop.set()
+        thread.join()
+
+        with open(path) as f:
+            stacks = f.read().splitlines()
+
+        self.assertTrue(any(stack.startswith('busy;') and ';busy (test_tracing.py:' in stack for stack in stacks))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from config import Config
+from file_upload import FileUpload
+from upload_cache import UploadCache
+
+
+def chunks(data: bytes):
+    yield data
+
+
+class TestUploadCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'upload_cache.json')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_lru(self):
+        cache = UploadCache(self.path, 2, 60)
+        cache.put('https://a', 'a')
+        cache.put('https://b', 'b')
+
+        self.assertEqual(cache.get('a'), 'https://a')
+
+        cache.put('https://c', 'c')
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('x', 'c'), 'https://c')
+        self.assertEqual(cache.stats(), {'entries': 2, 'hits': 2, 'misses': 1})
+
+        cache = UploadCache(self.path, 2, 60)
+        self.assertEqual(cache.get('a'), 'https://a')
+        self.assertEqual(cache.get('c'), 'https://c')
+
+    def test_ttl(self):
+        cache = UploadCache(self.path, 10, 60)
+        cache.put('https://a', 'a')
+
+        with mock.patch('time.time', return_value=time.time() + 120):
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(UploadCache(self.path, 10, 60).stats().get('entries'), 0)
+
+    def test_upload(self):
+        uploads = []
+
+        def handle(filename: str, chunks, size: int, mime: str):
+            uploads.append((filename, b''.join(chunks), size))
+            return True, f'https://example.com/{len(uploads)}'
+
+        cache = UploadCache(self.path, 10, 60)
+
+        with mock.patch.object(Config.FileUpload, 'Provider', 'POMF'), \
+                mock.patch.object(UploadCache, '_shared', cache), \
+                mock.patch.object(FileUpload, '_handle_pomf', handle):
+            self.assertEqual(FileUpload.upload('a.txt', chunks(b'hello'), 5, 'text/plain', 'F1'),
+                             (True, 'https://example.com/1'))
+            # Same content, different Slack file
+            self.assertEqual(FileUpload.upload('b.txt', chunks(b'hello'), 5, 'text/plain', 'F2'),
+                             (True, 'https://example.com/1'))
+            # Same Slack file, not even downloaded
+            self.assertEqual(FileUpload.upload('b.txt', chunks(b'garbage'), 5, 'text/plain', 'F2'),
+                             (True, 'https://example.com/1'))
+            self.assertEqual(FileUpload.upload('c.txt', chunks(b'world'), 5, 'text/plain', 'F3'),
+                             (True, 'https://example.com/2'))
+
+        self.assertEqual(uploads, [('a.txt', b'hello', 5), ('c.txt', b'world', 5)])
+        # One lookup per upload, even when the Slack file is not known yet
+        self.assertEqual(cache.stats().get('hits'), 2)
+        self.assertEqual(cache.stats().get('misses'), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
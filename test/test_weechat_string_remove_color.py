@@ -60,6 +60,21 @@ class TestWeeChatStringRemoveColor(unittest.TestCase):
             'Mode \x1913#titandev-test \x1928[\x1c+r\x1928]\x1c by \x1915LuK1337'),
             'Mode #titandev-test [+r] by LuK1337')
 
+    def test_plain(self):
+        self.assertEqual(Utils.weechat_string_remove_color('LuK1337'), 'LuK1337')
+        self.assertEqual(Utils.weechat_string_remove_color('\x1915LuK1337'), 'LuK1337')
+
+        # Served from the cache of short strings the second time
+        hits = Utils._weechat_string_remove_color_cached.cache_info().hits
+        self.assertEqual(Utils.weechat_string_remove_color('\x1915LuK1337'), 'LuK1337')
+        self.assertEqual(Utils._weechat_string_remove_color_cached.cache_info().hits, hits + 1)
+
+        # Too long to be cached, still returned as it is
+        self.assertEqual(Utils.weechat_string_remove_color('LuK1337 ' * 20), 'LuK1337 ' * 20)
+
+    def test_long(self):
+        self.assertEqual(Utils.weechat_string_remove_color('\x19F12luk\x1928 ' * 100), 'luk ' * 100)
+
 
 if __name__ == '__main__':
     unittest.main()
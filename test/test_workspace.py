@@ -0,0 +1,43 @@
+import unittest
+from collections import namedtuple
+from unittest import mock
+
+from config import Config
+from workspace import Workspace
+
+Buffer = namedtuple('Buffer', 'full_name')
+
+
+class TestWorkspace(unittest.TestCase):
+    def test_configured(self):
+        extra = {
+            'mirror': {
+                'Token': 'xoxb-mirror',
+                'Channels': {'irc.freenode.#lineageos': 'lineageos'},
+            },
+        }
+
+        with mock.patch.object(Config.Slack, 'Extra', extra), \
+                mock.patch.object(Config.Global, 'PrivMsgs', {'irc.freenode.': '_freenode_dm_'}):
+            main, mirror = Workspace.configured()
+
+        self.assertEqual(main.name, '')
+        self.assertEqual(main.token, Config.Slack.Token)
+
+        self.assertEqual(mirror.name, 'mirror')
+        self.assertEqual(mirror.token, 'xoxb-mirror')
+        self.assertEqual(mirror.api_url, Config.Slack.ApiUrl)
+        self.assertEqual(mirror.routing.slack_channel_for_buffer('irc.freenode.#lineageos'), 'lineageos')
+        # Not in its own Channels, DMs still default to Global
+        self.assertIsNone(mirror.routing.slack_channel_for_buffer('irc.freenode.#lineageos-dev'))
+        self.assertEqual(mirror.direct_message_channels([Buffer('irc.freenode.LuK1337'), Buffer('irc.oftc.x')]),
+                         [('irc.freenode.LuK1337', '_freenode_dm_luk1337')])
+
+        # Echoes are tracked per workspace
+        main.echoes.add('irc.freenode.#lineageos', 'hello')
+        self.assertFalse(mirror.echoes.match('irc.freenode.#lineageos', 'hello'))
+        self.assertTrue(main.echoes.match('irc.freenode.#lineageos', 'hello'))
+
+
+if __name__ == '__main__':
+    unittest.main()
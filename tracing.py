@@ -0,0 +1,221 @@
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from config import Config
+
+
+class Trace:
+    id: str
+    name: str
+
+    def __init__(self, tracer, trace_id: str, name: str, attrs: dict):
+        self.tracer = tracer
+        self.id = trace_id
+        self.name = name
+        self.attrs = attrs
+
+        self.wall = time.time()
+        self.started = time.perf_counter()
+
+        self._open = {}
+        self._spans = []
+        self._finished = False
+
+    def begin(self, name: str):
+        self._open[name] = time.perf_counter()
+
+    def end(self, name: str):
+        started = self._open.pop(name, None)
+
+        if started is not None:
+            self._spans.append((name, started, time.perf_counter()))
+
+    def span(self, name: str):
+        return _Span(self, name)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self, **attrs):
+        # Whoever is the last one to touch the message finishes the trace, exactly once
+        if self._finished:
+            return
+
+        self._finished = True
+        self.attrs.update(attrs)
+
+        self.tracer.finished(self, time.perf_counter() - self.started)
+
+    def to_dict(self, total: float):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'time': self.wall,
+            'total_ms': round(total * 1000, 3),
+            'spans': [{
+                'name': name,
+                'start_ms': round((started - self.started) * 1000, 3),
+                'duration_ms': round((ended - started) * 1000, 3),
+            } for name, started, ended in self._spans],
+            **self.attrs,
+        }
+
+
+class _Span:
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.trace.begin(self.name)
+
+    def __exit__(self, *args):
+        self.trace.end(self.name)
+
+
+class _NullTrace:
+    # Handed out while tracing is disabled, does nothing as cheaply as possible
+    id = None
+    name = None
+
+    def begin(self, name: str):
+        pass
+
+    def end(self, name: str):
+        pass
+
+    def span(self, name: str):
+        return self
+
+    def set(self, **attrs):
+        pass
+
+    def finish(self, **attrs):
+        pass
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+class Tracer:
+    path: str
+    threshold: float
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: str, threshold: float):
+        self.path = path
+        self.threshold = threshold
+
+        # Unique across restarts without paying for uuid4 on every message
+        self._prefix = os.urandom(4).hex()
+        self._ids = itertools.count()
+
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def shared():
+        with Tracer._shared_lock:
+            if Tracer._shared is None:
+                Tracer._shared = Tracer(Config.Tracing.SlowPath, Config.Tracing.SlowThreshold)
+
+            return Tracer._shared
+
+    def start(self, name: str, **attrs):
+        if not self.path:
+            return NULL_TRACE
+
+        return Trace(self, f'{self._prefix}-{next(self._ids):x}', name, attrs)
+
+    def finished(self, trace: Trace, total: float):
+        if total < self.threshold:
+            return
+
+        logging.warning(f'Slow {trace.name} trace {trace.id}: {total * 1000:.0f}ms')
+
+        line = json.dumps(trace.to_dict(total), default=str)
+
+        try:
+            with self._lock, open(self.path, 'a') as f:
+                f.write(line + '\n')
+        except OSError:
+            logging.exception(f'Failed to write slow trace to {self.path}')
+
+
+class SamplingProfiler:
+    path: str
+    interval: float
+
+    def __init__(self, path: str, interval: float):
+        self.path = path
+        self.interval = interval
+
+        self._stopped = threading.Event()
+        self._thread = None
+        self._stacks = Counter()
+
+    def toggle(self):
+        if self._thread is None:
+            self.start()
+        else:
+            self.stop()
+
+    def start(self):
+        logging.info(f'Profiler started, sampling every {self.interval}s')
+
+        self._stopped.clear()
+        self._stacks.clear()
+
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+        # Collapsed stacks, ready for flamegraph.pl or speedscope
+        with open(self.path, 'w') as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+        logging.info(f'Profiler stopped, {sum(self._stacks.values())} samples written to {self.path}')
+
+    def _sample(self):
+        me = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+
+            frames = []
+
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+
+            frames.append(names.get(ident, str(ident)))
+
+            self._stacks[';'.join(reversed(frames))] += 1
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+from metrics import Metrics
+
+
+class UploadCache:
+    path: str
+    max_entries: int
+    ttl: float
+
+    hits: int
+    misses: int
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: str, max_entries: int, ttl: float):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+
+        # key -> (url, expires), least recently used first
+        self._entries = OrderedDict()
+
+        self._load()
+
+    @staticmethod
+    def shared():
+        with UploadCache._shared_lock:
+            if UploadCache._shared is None:
+                cache = UploadCache._shared = UploadCache(Config.FileUpload.CachePath,
+                                                          Config.FileUpload.CacheSize,
+                                                          Config.FileUpload.CacheTtl)
+
+                Metrics.UPLOAD_CACHE.labels('hit').set_function(lambda: cache.hits)
+                Metrics.UPLOAD_CACHE.labels('miss').set_function(lambda: cache.misses)
+
+            return UploadCache._shared
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            logging.exception(f'Failed to load upload cache from {self.path}')
+            return
+
+        now = time.time()
+
+        for key, (url, expires) in sorted(entries.items(), key=lambda entry: entry[1][1]):
+            if expires > now:
+                self._entries[key] = (url, expires)
+
+        self._evict()
+
+    def _save(self):
+        # Called with the lock held, the index is small enough to be rewritten as a whole
+        if not self.path:
+            return
+
+        try:
+            with open(f'{self.path}.tmp', 'w') as f:
+                json.dump(dict(self._entries), f)
+
+            os.replace(f'{self.path}.tmp', self.path)
+        except OSError:
+            logging.exception(f'Failed to save upload cache to {self.path}')
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, *keys, count_miss: bool = True):
+        # Returns the URL of the first key found, counts as a single lookup. Lookups
+        # followed by another one for the same file leave counting a miss to the last one
+        now = time.time()
+
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+
+                if entry is None:
+                    continue
+
+                if entry[1] <= now:
+                    del self._entries[key]
+                    continue
+
+                self._entries.move_to_end(key)
+                self.hits += 1
+
+                return entry[0]
+
+            if count_miss:
+                self.misses += 1
+
+            return None
+
+    def put(self, url: str, *keys):
+        expires = time.time() + self.ttl
+
+        with self._lock:
+            for key in keys:
+                self._entries[key] = (url, expires)
+                self._entries.move_to_end(key)
+
+            self._evict()
+            self._save()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,57 @@
+import asyncio
+
+from config import Config
+from echo_index import EchoIndex
+from routing import RoutingTable
+from slack_client import SlackClient
+
+
+class Workspace:
+    # The main workspace has no name
+    name: str
+    token: str
+    api_url: str
+
+    # WeeChat <> Slack channel map of this workspace, including DMs
+    routing: RoutingTable
+
+    # Messages sent from this workspace, so that WeeChat echoing them is not posted back here
+    echoes: EchoIndex
+
+    slack_client: SlackClient
+
+    def __init__(self, name: str, token: str, api_url: str, routing: RoutingTable):
+        self.name = name
+        self.token = token
+        self.api_url = api_url
+        self.routing = routing
+        self.echoes = EchoIndex(Config.Slack.EchoTtl)
+        self.slack_client = None
+
+    @staticmethod
+    def configured():
+        workspaces = [Workspace('', Config.Slack.Token, Config.Slack.ApiUrl, RoutingTable.default())]
+
+        for name, settings in Config.Slack.Extra.items():
+            routing = RoutingTable(settings.get('Channels', Config.Global.Channels),
+                                   settings.get('PrivMsgs', Config.Global.PrivMsgs))
+
+            workspaces.append(Workspace(name, settings.get('Token', ''), settings.get('ApiUrl', Config.Slack.ApiUrl),
+                                        routing))
+
+        return workspaces
+
+    def connect(self, loop: asyncio.AbstractEventLoop, state: dict = None):
+        self.slack_client = SlackClient(loop, self.name, self.token, self.api_url, self.routing.forward, state)
+
+    def direct_message_channels(self, buffers: list):
+        # (buffer full name, Slack channel) of every DM buffer
+        ret = []
+
+        for buffer in buffers:
+            slack_channel = self.routing.dm_channel_for_buffer(buffer.full_name)
+
+            if slack_channel is not None:
+                ret.append((buffer.full_name, slack_channel))
+
+        return ret